@@ -0,0 +1,95 @@
+import argparse, json, multiprocessing, os, statistics, tempfile, time
+from Classes.database import open_connection
+from Classes.database_setup import create_tables, migrate_database, load_flights
+from Classes.search_cache import search_cache
+from Classes.seat_inventory import reserve_seat, book_seat, flight_key
+
+# The single flight every worker competes for
+FLIGHT = ("BENCH100", "London", "Paris", "2030-01-01", "2030-01-08", "economy", 100.0)
+
+# Create a scratch database holding one flight with `seats` seats
+def prepare_database(path, seats):
+    conn = open_connection(path)
+    create_tables(conn)
+    migrate_database(conn)
+    load_flights(conn, [FLIGHT], (FLIGHT[3], FLIGHT[3]))
+    with conn:
+        conn.execute("UPDATE flights SET seats_left = ?", (seats,))
+    conn.close()
+
+def init_worker(cache_path):
+    search_cache.store_path = cache_path
+
+# Keep booking until the flight is full; returns (bookings made, attempt latencies in seconds)
+def run_worker(args):
+    path, worker, hold = args
+    conn = open_connection(path)
+    name = f"bencher{worker}"
+    booking = (name, FLIGHT[1], FLIGHT[2], FLIGHT[3], FLIGHT[4], FLIGHT[0], FLIGHT[5])
+    booked = 0
+    latencies = []
+    while True:
+        started = time.perf_counter()
+        hold_id = reserve_seat(conn, FLIGHT, name) if hold else None
+        success = (hold_id is not None or not hold) and book_seat(conn, flight_key(FLIGHT), booking, hold_id)
+        latencies.append(time.perf_counter() - started)
+        if not success:
+            break
+        booked += 1
+    conn.close()
+    return booked, latencies
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+# Let `workers` processes book the same flight until it sells out, then check nothing was oversold
+def run_benchmark(workers, seats, hold):
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, "flights.db")
+        cache_path = os.path.join(scratch, "search_cache.db")
+        search_cache.store_path = cache_path
+        prepare_database(path, seats)
+
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(workers, initializer=init_worker, initargs=(cache_path,)) as pool:
+            started = time.perf_counter()
+            results = pool.map(run_worker, [(path, worker, hold) for worker in range(workers)])
+            elapsed = time.perf_counter() - started
+
+        conn = open_connection(path)
+        bookings = conn.execute("SELECT COUNT(*) FROM bookings").fetchone()[0]
+        seats_left = conn.execute("SELECT seats_left FROM flights").fetchone()[0]
+        holds = conn.execute("SELECT COUNT(*) FROM holds").fetchone()[0]
+        conn.close()
+
+    latencies = sorted(latency for _, worker_latencies in results for latency in worker_latencies)
+    return {
+        "workers": workers,
+        "seats": seats,
+        "holds": hold,
+        "bookings": bookings,
+        "seats_left": seats_left,
+        "open_holds": holds,
+        "oversold": bookings > seats or sum(booked for booked, _ in results) != bookings,
+        "seconds": elapsed,
+        "bookings_per_second": bookings / elapsed if elapsed else float("inf"),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stress test concurrent bookings against one flight.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16], help="concurrent booking processes")
+    parser.add_argument("--seats", type=int, default=2000, help="seats on the contested flight")
+    parser.add_argument("--hold", action="store_true", help="hold each seat before booking it, as the chat flow does")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per run")
+    args = parser.parse_args()
+
+    for workers in args.workers:
+        report = run_benchmark(workers, args.seats, args.hold)
+        if args.json:
+            print(json.dumps(report))
+        else:
+            print(f"{workers:>3} workers: {report['bookings']}/{report['seats']} seats booked in {report['seconds']:.2f}s "
+                  f"({report['bookings_per_second']:,.0f}/sec, p50 {report['p50_ms']:.2f}ms, p99 {report['p99_ms']:.2f}ms), "
+                  f"oversold: {report['oversold']}")
@@ -0,0 +1,61 @@
+import argparse, re, timeit
+from datetime import date, datetime, timedelta
+from Classes.date_parser import parse_date, scan_travel_dates, weekdays
+
+# Replies typed while filling the departure date slot
+SAMPLES = [
+    "tomorrow", "next week", "in 3 days", "next friday", "monday", "20-11-2026",
+    "I want to fly from London to Paris next tuesday", "sometime soon", "book it please",
+]
+
+# The substring-and-strptime parser this module replaced, kept for comparison
+def legacy_parse_date(input_text):
+    reference_date = datetime.now()
+    try:
+        if "tomorrow" in input_text:
+            return reference_date + timedelta(days=1)
+        elif "next week" in input_text:
+            return reference_date + timedelta(weeks=1)
+        elif "in " in input_text and " days" in input_text:
+            days = int(re.search(r'in (\d+) days', input_text).group(1))
+            return reference_date + timedelta(days=days)
+        match = re.match(r'next (\w+)', input_text.lower())
+        if match:
+            return legacy_weekday_date(match.group(1), True)
+        for weekday in weekdays:
+            if weekday in input_text.lower():
+                return legacy_weekday_date(weekday, False)
+        return datetime.strptime(input_text, '%d-%m-%Y')
+    except (ValueError, AttributeError):
+        return None
+
+def legacy_weekday_date(weekday_name, next_flag):
+    weekday_name = weekday_name.lower()
+    if weekday_name not in weekdays:
+        return None
+    today = datetime.now()
+    days = (weekdays[weekday_name] - today.weekday() + 7) % 7
+    if next_flag:
+        days += 7
+    if days == 0:
+        days = 7
+    return today + timedelta(days=days)
+
+# Microseconds per parse, averaged over the samples
+def per_parse(parse, repeat):
+    seconds = min(timeit.repeat(lambda: [parse(sample) for sample in SAMPLES], number=repeat, repeat=5))
+    return seconds / (repeat * len(SAMPLES)) * 1e6
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the cost of one date parse.")
+    parser.add_argument("--repeat", type=int, default=2000, help="passes over the samples per timing")
+    args = parser.parse_args()
+
+    today = date.today()
+    timings = {
+        "legacy parse_date": per_parse(legacy_parse_date, args.repeat),
+        "grammar, uncached": per_parse(lambda text: scan_travel_dates.__wrapped__(text.lower(), today), args.repeat),
+        "grammar, cached": per_parse(parse_date, args.repeat),
+    }
+    for name, micros in timings.items():
+        print(f"{name:<20} {micros:7.2f} us/parse")
@@ -0,0 +1,82 @@
+import argparse, random, statistics, time
+from sklearn.metrics.pairwise import cosine_similarity
+from Classes.intent_matching import QA_THRESHOLD
+from Classes.qa_retriever import QARetriever, build_qa_store
+
+# Words shared by most questions, and templates for synthetic FAQ entries
+TEMPLATES = [
+    "what is the {0} policy for {1}",
+    "can i bring {0} on {1} flights",
+    "how do i change my {0} booking to {1}",
+    "is {0} included with {1} tickets",
+    "where do i find {0} for {1}",
+]
+
+# A synthetic FAQ of `size` preprocessed questions, drawing topic words with a Zipf-like skew
+def make_faq(size, vocabulary_size, seed):
+    rng = random.Random(seed)
+    words = [f"term{number}" for number in range(vocabulary_size)]
+    weights = [1 / (rank + 1) for rank in range(vocabulary_size)]
+    questions = [rng.choice(TEMPLATES).format(*(" ".join(rng.choices(words, weights, k=2)) for _ in range(2)))
+                 for _ in range(size)]
+    return questions, [f"Answer {number}" for number in range(size)]
+
+# Queries close to known questions (one word dropped or swapped) plus some unrelated ones
+def make_queries(questions, count, seed):
+    rng = random.Random(seed)
+    queries = []
+    for number in range(count):
+        words = rng.choice(questions).split()
+        if number % 3 == 0:
+            del words[rng.randrange(len(words))]
+        elif number % 3 == 1:
+            words[rng.randrange(len(words))] = f"term{rng.randrange(10 ** 6)}"
+        else:
+            words = ["how", "late", "is", "the", "train", "to", "town"]
+        queries.append(" ".join(words))
+    return queries
+
+# The dense lookup this retriever replaced: cosine similarity against every question
+def dense_lookup(store, matrix, query):
+    similarities = cosine_similarity(store["vectorizer"].transform([query]), matrix)[0]
+    best = similarities.argmax()
+    return (best, similarities[best]) if similarities[best] > QA_THRESHOLD else None
+
+def latency(lookup, queries):
+    samples = []
+    for query in queries:
+        started = time.perf_counter()
+        lookup(query)
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return {"p50_ms": statistics.median(samples) * 1000, "p99_ms": samples[int(0.99 * len(samples))] * 1000}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare dense and inverted-index QA lookups on a synthetic FAQ.")
+    parser.add_argument("--questions", type=int, default=100000, help="FAQ entries to index")
+    parser.add_argument("--vocabulary", type=int, default=20000, help="distinct topic words")
+    parser.add_argument("--queries", type=int, default=300, help="lookups to time")
+    args = parser.parse_args()
+
+    questions, answers = make_faq(args.questions, args.vocabulary, seed=0)
+    started = time.perf_counter()
+    store = build_qa_store(questions, answers)
+    print(f"Indexed {args.questions} questions in {time.perf_counter() - started:.1f}s")
+
+    retriever = QARetriever(store)
+    matrix = store["vectorizer"].transform(questions)
+    queries = make_queries(questions, args.queries, seed=1)
+
+    # Both lookups must pick the same answer (or none) for every query
+    agree = 0
+    for query in queries:
+        dense = dense_lookup(store, matrix, query)
+        found = retriever.search(query, 1, QA_THRESHOLD)
+        agree += (dense is None and not found) or (dense is not None and found and answers[dense[0]] == found[0][0])
+    print(f"Top answer agreement: {agree}/{len(queries)}")
+
+    for name, lookup in [("dense cosine", lambda query: dense_lookup(store, matrix, query)),
+                         ("inverted index", lambda query: retriever.search(query, 1, QA_THRESHOLD)),
+                         ("inverted index, top 5", lambda query: retriever.search(query, 5, QA_THRESHOLD))]:
+        timing = latency(lookup, queries)
+        print(f"{name:<22} p50 {timing['p50_ms']:7.3f}ms  p99 {timing['p99_ms']:7.3f}ms")
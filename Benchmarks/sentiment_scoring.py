@@ -0,0 +1,26 @@
+import argparse, timeit
+from Classes.sentiment_analysis import get_sentiment_pipeline, get_sentiment_scorer, load_sentiment_dataset
+from Classes.sentiment_scorer import verify_scorer
+
+# Microseconds per utterance when scoring `batch` utterances per call
+def per_utterance(predict, texts, batch, repeat):
+    chunk = (texts * (batch // len(texts) + 1))[:batch]
+    seconds = min(timeit.repeat(lambda: predict(chunk), number=repeat, repeat=5))
+    return seconds / (repeat * batch) * 1e6
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the compiled sentiment scorer with the scikit-learn pipeline.")
+    parser.add_argument("--repeat", type=int, default=200, help="calls per timing")
+    args = parser.parse_args()
+
+    pipeline, scorer = get_sentiment_pipeline(), get_sentiment_scorer()
+    texts = list(load_sentiment_dataset()[0])
+    report = verify_scorer(scorer, pipeline, texts)
+    print(f"{report['label_mismatches']} of {report['texts']} training utterances classified differently, "
+          f"largest probability difference {report['max_probability_error']:.1e}")
+
+    for batch in (1, 32, 1000):
+        repeat = max(1, args.repeat // batch)
+        sklearn_micros = per_utterance(pipeline.predict, texts, batch, repeat)
+        scorer_micros = per_utterance(scorer.predict, texts, batch, repeat)
+        print(f"batch {batch:>4}: pipeline {sklearn_micros:8.1f} us/utterance, scorer {scorer_micros:8.1f} us/utterance")
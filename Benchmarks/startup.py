@@ -0,0 +1,85 @@
+import argparse, json, os, re, selectors, statistics, subprocess, sys, time
+
+# Lines written by `python -X importtime`: "import time: <self us> | <cumulative us> | <indented module>"
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+# Read a child's stdout until `marker` appears; returns the seconds taken, or None if it exited first
+def wait_for(process, marker, started, timeout):
+    selector = selectors.DefaultSelector()
+    selector.register(process.stdout, selectors.EVENT_READ)
+    output = b""
+    while marker not in output:
+        remaining = timeout - (time.perf_counter() - started)
+        if remaining <= 0 or not selector.select(remaining):
+            return None
+        chunk = os.read(process.stdout.fileno(), 4096)
+        if not chunk:
+            return None
+        output += chunk
+    return time.perf_counter() - started
+
+# Start the chatbot and time the name prompt, then the prompt after answering it,
+# which is when the models are ready for the first real turn
+def time_to_prompt(timeout):
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "chatbot.py", "--seed", "skip"], stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        first_prompt = wait_for(process, b"Enter your name:", started, timeout)
+        process.stdin.write(b"Bench\n")
+        process.stdin.flush()
+        ready = wait_for(process, b"Bench:", started, timeout)
+    finally:
+        process.kill()
+        process.wait()
+    return first_prompt, ready
+
+# Import `module` in a fresh interpreter; returns its cumulative import seconds and the
+# (cumulative seconds, module) of each of its direct imports, slowest first
+def import_times(module):
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True).stderr
+    children = []
+    for match in IMPORT_LINE.finditer(stderr):
+        depth, seconds, name = len(match.group(3)) // 2, int(match.group(2)) / 1e6, match.group(4)
+        if depth == 1:
+            children.append((seconds, name))
+        elif depth == 0 and name == module:
+            return seconds, sorted(children, reverse=True)
+        elif depth == 0:
+            children = []
+    return None, []
+
+def startup_report(runs, timeout):
+    prompts = [time_to_prompt(timeout) for _ in range(runs)]
+    first_prompts = [first for first, _ in prompts if first is not None]
+    ready = [ready for _, ready in prompts if ready is not None]
+    greeting_seconds, greeting_imports = import_times("chatbot")
+    return {
+        "runs": runs,
+        "first_prompt_seconds": statistics.median(first_prompts) if first_prompts else None,
+        "ready_seconds": statistics.median(ready) if ready else None,
+        "greeting_import_seconds": greeting_seconds,
+        "greeting_imports": greeting_imports,
+        "conversation_import_seconds": import_times("Classes.conversation")[0],
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report the chatbot's time to first prompt and what it imports.")
+    parser.add_argument("--runs", type=int, default=5, help="chatbot launches to take the median over")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds to wait for each prompt")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = startup_report(args.runs, args.timeout)
+    if args.json:
+        print(json.dumps(report))
+    else:
+        show = lambda seconds: "failed" if seconds is None else f"{seconds:.3f}s"
+        print(f"First prompt after {show(report['first_prompt_seconds'])}, "
+              f"first turn ready after {show(report['ready_seconds'])} (median of {args.runs})")
+        print(f"Greeting path imports: {report['greeting_import_seconds']:.3f}s; "
+              f"conversation modules: {report['conversation_import_seconds']:.3f}s, loaded in the background")
+        for seconds, module in report["greeting_imports"][:args.top]:
+            print(f"  {seconds * 1000:8.1f} ms  {module}")
@@ -0,0 +1,206 @@
+import argparse, csv, itertools, json, os, random, resource, shutil, statistics, subprocess, sys, tempfile, time
+from collections import defaultdict
+from datetime import datetime, timedelta
+import Classes.conversation as conversation_module
+from Classes import database, intent_matching, metrics, model_registry
+from Classes.database import open_connection
+from Classes.database_setup import create_tables, migrate_database, load_flights, generate_flight_data, INVENTORY_DAYS
+from Classes.dialogue import Session
+from Classes.intent_matching import get_intent_index
+from Classes.location_catalog import catalog
+from Classes.search_cache import search_cache
+from Classes.sentiment_analysis import get_sentiment_scorer
+
+# Scripted conversations; the first message answers the name prompt
+SCRIPTS = [
+    ["Ann", "hello", "Where can I go?", "book a flight from London to New York tomorrow in economy", "yes",
+     "how are you", "I am great, thanks", "show my bookings", "no", "thanks", "bye"],
+    ["Ben", "what can you do?", "I want to fly from Dubai to Paris next friday", "business", "no",
+     "what is my name?", "thank you", "goodbye"],
+    ["Cat", "hi there", "book a trip from Sydney to Tokyo in 3 days", "first", "yes", "view my bookings", "yes",
+     "1", "no", "how are you doing", "not great to be honest", "bye"],
+]
+
+# Words used to make synthetic intent phrases and QA questions for scaled datasets
+FILLER_PREFIXES = ["", "please", "could you", "i would like to", "can you", "hey"]
+FILLER_SUFFIXES = ["", "now", "today", "for me", "please", "thanks"]
+QA_TOPICS = ["baggage", "meals", "seats", "refunds", "lounges", "pets", "wifi", "check-in", "upgrades", "delays"]
+
+# Conversation stages timed by wrapping the functions the conversation loop calls: (attribute, is a flow)
+STAGES = {
+    "find_answer": ("find_answer", False),
+    "match_intent": ("match_intent", False),
+    "sentiment": ("sentiment_response", False),
+    "booking_flow": ("booking_flow", True),
+    "manage_bookings": ("display_and_cancel_booking", True),
+}
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    pick = lambda fraction: ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+    return {"count": len(ordered), "mean_ms": statistics.fmean(ordered) * 1000,
+            "p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+# Write an intents file with `scale` times as many phrases, made by wrapping each phrase in filler words
+def write_scaled_intents(path, scale):
+    intents = intent_matching.load_intents()
+    variants = list(itertools.product(FILLER_PREFIXES, FILLER_SUFFIXES))
+    scaled = {intent: [" ".join(filter(None, (prefix, phrase, suffix)))
+                       for phrase in phrases for prefix, suffix in variants[:scale]]
+              for intent, phrases in intents.items()}
+    with open(path, "w") as f:
+        json.dump({"intents": scaled}, f)
+
+# Write a QA file with the original questions plus synthetic ones, `scale` times as many in total
+def write_scaled_qa(path, scale):
+    with open(intent_matching.QA_FILE, newline="") as f:
+        rows = list(csv.DictReader(f))
+    synthetic = [{"Question": f"What is the {topic} policy on route {number}?",
+                  "Answer": f"The {topic} policy for route {number} is on our website."}
+                 for number in range(len(rows) * (scale - 1) // len(QA_TOPICS) + 1) for topic in QA_TOPICS]
+    rows += synthetic[:len(rows) * (scale - 1)]
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["Question", "Answer"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+# Point the database, search cache and model artifacts at a scratch directory and fill it
+def prepare_environment(scratch, scale):
+    database.DB_PATH = os.path.join(scratch, "flights.db")
+    search_cache.store_path = os.path.join(scratch, "search_cache.db")
+
+    # Reuse artifacts that are already built; scaled datasets compile their own index here
+    model_registry.MODEL_DIR = os.path.join(scratch, "models")
+    if os.path.isdir("Resources/models"):
+        shutil.copytree("Resources/models", model_registry.MODEL_DIR)
+
+    if scale > 1:
+        intents_file, qa_file = os.path.join(scratch, "intents.json"), os.path.join(scratch, "qa.csv")
+        write_scaled_intents(intents_file, scale)
+        write_scaled_qa(qa_file, scale)
+        intent_matching.INTENTS_FILE, intent_matching.QA_FILE = intents_file, qa_file
+    with open(intent_matching.QA_FILE, newline="") as f:
+        dataset = {"intent_phrases": sum(len(phrases) for phrases in intent_matching.load_intents().values()),
+                   "qa_rows": sum(1 for _ in csv.DictReader(f))}
+
+    conn = open_connection()
+    create_tables(conn)
+    migrate_database(conn)
+    catalog.refresh(force=True)
+    tomorrow = datetime.now() + timedelta(days=1)
+    window = (tomorrow.strftime("%Y-%m-%d"), (tomorrow + timedelta(days=INVENTORY_DAYS - 1)).strftime("%Y-%m-%d"))
+    dataset["flights"] = load_flights(conn, generate_flight_data(tomorrow, flights_per_day=scale), window)["rows"]
+    return dataset
+
+# Wrap a conversation function so each call is timed
+def timed_call(func, samples):
+    def call(*args, **kwargs):
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        samples.append(time.perf_counter() - started)
+        return result
+    return call
+
+# Wrap a flow so each step between prompts is timed, excluding the time spent waiting for replies
+def timed_flow(func, samples):
+    def flow(*args, **kwargs):
+        steps = func(*args, **kwargs)
+        reply = None
+        while True:
+            started = time.perf_counter()
+            try:
+                item = steps.send(reply)
+            except StopIteration as stop:
+                samples.append(time.perf_counter() - started)
+                return stop.value
+            samples.append(time.perf_counter() - started)
+            reply = yield item
+    return flow
+
+# Time importing the conversation modules in a fresh interpreter
+def measure_import():
+    code = "import time; t = time.perf_counter(); import Classes.conversation; print(time.perf_counter() - t)"
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return {"import_seconds": float(output), "interpreter_seconds": time.perf_counter() - started}
+
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+# Drive the scripted conversations `rounds` times and report latency per turn and per stage;
+# with `stage_metrics` the in-process stage histograms are included too
+def run_benchmark(scale, rounds, seed=0, stage_metrics=False):
+    random.seed(seed)
+    if stage_metrics:
+        metrics.enable()
+        metrics.reset()
+    report = {"commit": current_commit(), "scale": scale, "rounds": rounds, "startup": measure_import()}
+    with tempfile.TemporaryDirectory() as scratch:
+        report["dataset"] = prepare_environment(scratch, scale)
+
+        started = time.perf_counter()
+        get_intent_index()
+        get_sentiment_scorer()
+        report["startup"]["model_load_seconds"] = time.perf_counter() - started
+
+        stage_samples = defaultdict(list)
+        for stage, (attribute, is_flow) in STAGES.items():
+            wrap = timed_flow if is_flow else timed_call
+            setattr(conversation_module, attribute, wrap(getattr(conversation_module, attribute), stage_samples[stage]))
+
+        turn_samples = []
+        started = time.perf_counter()
+        for round_number in range(rounds):
+            for script in SCRIPTS:
+                session = Session(conversation_module.conversation())
+                session.start()
+                for message in [f"{script[0]}{round_number}"] + script[1:]:
+                    if session.finished:
+                        break
+                    turn_started = time.perf_counter()
+                    session.send(message)
+                    turn_samples.append(time.perf_counter() - turn_started)
+        elapsed = time.perf_counter() - started
+
+    report["turns"] = len(turn_samples)
+    report["turns_per_second"] = len(turn_samples) / elapsed
+    report["turn_latency"] = percentiles(turn_samples)
+    report["stages"] = {stage: percentiles(samples) for stage, samples in stage_samples.items() if samples}
+    if stage_metrics:
+        report["stage_metrics"] = metrics.snapshot()
+    # ru_maxrss is in kilobytes on Linux
+    report["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return report
+
+# Print how each latency moved relative to an earlier report
+def compare(report, baseline):
+    rows = [("turn", report["turn_latency"], baseline.get("turn_latency"))]
+    rows += [(stage, stats, baseline.get("stages", {}).get(stage)) for stage, stats in report["stages"].items()]
+    print(f"\n{'stage':<16}{'p50 ms':>10}{'was':>10}{'p95 ms':>10}{'was':>10}")
+    for stage, stats, before in rows:
+        before = before or {}
+        print(f"{stage:<16}{stats['p50_ms']:>10.2f}{before.get('p50_ms', float('nan')):>10.2f}"
+              f"{stats['p95_ms']:>10.2f}{before.get('p95_ms', float('nan')):>10.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark full conversation turns against a scratch database.")
+    parser.add_argument("--scale", type=int, default=1, help="multiply intents, QA rows and flights per day")
+    parser.add_argument("--rounds", type=int, default=20, help="times to replay the scripted conversations")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    parser.add_argument("--metrics", action="store_true", help="include the stage timing histograms in the report")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.scale, args.rounds, stage_metrics=args.metrics)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
@@ -0,0 +1,86 @@
+import argparse, json, multiprocessing, statistics, tempfile
+from Benchmarks.turn_pipeline import SCRIPTS, prepare_environment
+from Classes.dialogue import Session
+from Classes.startup import load_conversation, preload_for_workers
+
+# Seconds to wait for the other workers before giving up on a run
+TIMEOUT = 600
+
+# Memory of this process in MB from /proc (Linux only): resident, proportional (shared pages split
+# between the processes using them) and unique (pages no other process shares)
+def memory_usage():
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {"rss_mb": fields["Rss"], "pss_mb": fields["Pss"],
+            "uss_mb": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+# Hold a few conversations, then report memory once every worker has done the same
+def run_worker(measured, done, results):
+    conversation = load_conversation()
+    for number, script in enumerate(SCRIPTS):
+        session = Session(conversation())
+        session.start()
+        for message in [f"{script[0]}{number}"] + script[1:]:
+            session.send(message)
+    measured.wait(TIMEOUT)
+    results.put(memory_usage())
+    done.wait(TIMEOUT)
+
+# Fork `workers` workers, after loading the models in this process if `shared`
+def run_mode(shared, workers, scratch, results):
+    prepare_environment(scratch, 1)
+    if shared:
+        preload_for_workers()
+    context = multiprocessing.get_context("fork")
+    measured, done = context.Barrier(workers), context.Barrier(workers + 1)
+    worker_results = context.Queue()
+    processes = [context.Process(target=run_worker, args=(measured, done, worker_results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    usage = [worker_results.get(timeout=TIMEOUT) for _ in processes]
+    parent = memory_usage()
+    done.wait(TIMEOUT)
+    for process in processes:
+        process.join()
+    results.put({"parent": parent, "workers": usage})
+
+def measure(shared, workers):
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    with tempfile.TemporaryDirectory() as scratch:
+        coordinator = context.Process(target=run_mode, args=(shared, workers, scratch, results))
+        coordinator.start()
+        report = results.get(timeout=TIMEOUT)
+        coordinator.join()
+    mean = lambda key: statistics.fmean(usage[key] for usage in report["workers"])
+    return {
+        "mode": "shared" if shared else "per-worker",
+        "workers": workers,
+        "worker_uss_mb": mean("uss_mb"),
+        "worker_pss_mb": mean("pss_mb"),
+        "worker_rss_mb": mean("rss_mb"),
+        "parent_uss_mb": report["parent"]["uss_mb"],
+        "total_pss_mb": report["parent"]["pss_mb"] + sum(usage["pss_mb"] for usage in report["workers"]),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare worker memory with models loaded per worker or "
+                                                 "once before forking (Linux only).")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4], help="worker processes to fork")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per run")
+    args = parser.parse_args()
+
+    for workers in args.workers:
+        for shared in (False, True):
+            report = measure(shared, workers)
+            if args.json:
+                print(json.dumps(report))
+            else:
+                print(f"{report['mode']:>10}, {workers} workers: per worker {report['worker_uss_mb']:.1f} MB unique, "
+                      f"{report['worker_pss_mb']:.1f} MB proportional; parent {report['parent_uss_mb']:.1f} MB unique; "
+                      f"total {report['total_pss_mb']:.1f} MB")
@@ -1,35 +1,55 @@
-import sqlite3
 from Classes.responses import get_response
-from nltk import pos_tag, word_tokenize
-from nltk.metrics import edit_distance
-from Classes.date_parser import parse_date 
-
-# Constants for available origins and destinations
-ORIGINS = ["London", "Toronto", "Sydney", "Dubai", "Frankfurt", "Mumbai"]
-DESTINATIONS = ["Paris", "New York", "Berlin", "Singapore", "Tokyo", "Amsterdam"]
-
-# Database connection
-def connect_to_db():
-    return sqlite3.connect('Resources/flight_booking.db')
+from nltk import word_tokenize
+from datetime import datetime, timedelta
+from Classes.date_parser import parse_travel_dates, to_db_date, format_db_date, DB_DATE_FORMAT
+from Classes.dialogue import Ask
+from Classes.metrics import timed, timer
+from Classes.database import get_connection, fetch_all
+from Classes.location_catalog import catalog
+from Classes.entity_extractor import extract_booking_entities
+from Classes.preprocessing import preprocess_turn
+from Classes.flight_search import search_flights
+from Classes.seat_inventory import reserve_seat, release_hold, book_seat, cancel_seat
+
+# Number of days after the requested date searched for flights
+SEARCH_WINDOW_DAYS = 14
+
+# The closest location to the user input by name, IATA code or alias, accounting for typos,
+# as a (location, distance) pair, or None
+def closest_location(user_input, location_list, max_distance=2):
+    tokens = word_tokenize(user_input)
+    location = ' '.join(token for token in tokens if token.isalpha())
+    matches = catalog.matcher(location_list).search(location, max_distance, limit=1)
+    return matches[0] if matches else None
 
 # Match user input with the closest location accounting for typos
 def best_match_location(user_input, location_list, max_distance=2):
-    tokens = word_tokenize(user_input)
-    filtered_tokens = [token.capitalize() for token in tokens if token.isalpha()]
-    location = ' '.join(filtered_tokens)
-    best_match = min(location_list, key=lambda x: edit_distance(location, x))
-    return best_match if edit_distance(location, best_match) <= max_distance else None
+    match = closest_location(user_input, location_list, max_distance)
+    return match[0] if match else None
 
-# Confirm the best match location with the user
+# Confirm the best match location with the user; exact names, IATA codes and aliases need no confirmation
 def confirm_location(user_input, location_list, name):
-    suggested_location = best_match_location(user_input, location_list)
-    if suggested_location and suggested_location.lower() != user_input.lower():
-        print(f"Bot: Did you mean '{suggested_location}'? (yes/no)")
-        confirm = input(f"{name}: ").strip().lower()
-        if confirm in ["yes", "y"]:
-            return suggested_location
-        print("Bot: Got it, please try again.")
-    return user_input if user_input.capitalize() in location_list else None
+    match = closest_location(user_input, location_list)
+    if match is None:
+        return None
+    suggested_location, distance = match
+    if distance == 0:
+        return suggested_location
+    yield f"Bot: Did you mean '{suggested_location}'? (yes/no)"
+    confirm = (yield Ask(name)).strip().lower()
+    if confirm in ["yes", "y"]:
+        return suggested_location
+    yield "Bot: Got it, please try again."
+    return None
+
+# Whether a date range ("between X and Y") ends before it starts
+def ends_before_start(dates):
+    return bool(dates.departure and dates.latest and dates.latest < dates.departure)
+
+# The travel dates in a reply to the departure date prompt, or None without a usable departure date
+def parse_departure_reply(user_input):
+    dates = parse_travel_dates(user_input)
+    return dates if dates.departure and not ends_before_start(dates) else None
 
 # Parse booking details from user input
 def parse_booking_details(user_input, booking_details, name):
@@ -40,86 +60,83 @@ def parse_booking_details(user_input, booking_details, name):
         "travel_class": booking_details.get("travel_class"),
     }
 
-    tokens = word_tokenize(user_input)
-    pos_tags = pos_tag(tokens)
-
-    # Extract travel class
-    if not details["travel_class"]:
-        classes = {"economy": "economy", "business": "business", "first": "first"}
-        for key, value in classes.items():
-            if key in user_input.lower():
-                details["travel_class"] = value
-
-    # Handle "from" and "to" keywords for origin and destination
-    if "from" in tokens:
-        from_index = tokens.index("from") + 1
-        if from_index < len(tokens):
-            potential_origin = tokens[from_index]
-            if pos_tags[from_index][1] == 'NNP' or potential_origin.capitalize() in ORIGINS:
-                details["origin"] = confirm_location(potential_origin, ORIGINS, name) or details["origin"]
-
-    if "to" in tokens:
-        to_index = tokens.index("to") + 1
-        if to_index < len(tokens):
-            potential_destination = tokens[to_index]
-            if pos_tags[to_index][1] == 'NNP' or potential_destination.capitalize() in DESTINATIONS:
-                details["destination"] = confirm_location(potential_destination, DESTINATIONS, name) or details["destination"]
-
-    # Use POS tagging as a backup
-    for word, tag in pos_tags:
-        location = word.capitalize()
-        if tag == 'NNP' and not details["origin"] and location in ORIGINS:
-            details["origin"] = confirm_location(location, ORIGINS, name)
-        elif tag == 'NNP' and not details["destination"] and location in DESTINATIONS:
-            details["destination"] = confirm_location(location, DESTINATIONS, name)
-
-    # Extract departure date
+    # Locations, class and date come from one scan over the tokens intent matching already produced
+    entities = extract_booking_entities(preprocess_turn(user_input).tokens)
+    details["travel_class"] = details["travel_class"] or entities["travel_class"]
+    for role, locations in (("origin", catalog.origins()), ("destination", catalog.destinations())):
+        if details[role]:
+            continue
+        if entities[role] in locations:
+            details[role] = entities[role]
+            continue
+
+        # Words after "from"/"to" that aren't a known location may be a typo; check with the user
+        for candidate in entities["unmatched"].get(role, ()):
+            if best_match_location(candidate, locations):
+                details[role] = yield from confirm_location(candidate, locations, name)
+                break
+
+    # Extract the departure date, and the end of a date range if one was given.
+    # Every flight has a fixed return date, so a return date the user asks for can't be searched on.
     if not details["departure_date"]:
-        details["departure_date"] = parse_date(user_input)
+        dates = parse_travel_dates(user_input)
+        if ends_before_start(dates):
+            yield "Bot: That date range ends before it starts, so I'll ask for your dates again."
+        else:
+            details["departure_date"] = dates.departure
+            if dates.latest:
+                details["latest_departure"] = dates.latest
 
     # Acknowledge parsed details
     if any(details.values()):
-        print("\nBot: Here's what I've understood so far:")
+        yield "\nBot: Here's what I've understood so far:"
         for key, value in details.items():
-            print(f" - {key.capitalize()}: {value or 'Not provided yet'}")
-        print("")
+            if isinstance(value, datetime):
+                value = format_db_date(to_db_date(value))
+            yield f" - {key.capitalize()}: {value or 'Not provided yet'}"
+        yield ""
     return details
 
-# Find flights in the database
-def find_flights(conn, origin, destination, departure_date, travel_class):
-    cursor = conn.cursor()
-    query = '''
-    SELECT flight_number, origin, destination, departure_date, return_date, travel_class, price
-    FROM flights
-    WHERE origin = ? AND destination = ? AND departure_date = ? AND travel_class = ?
-    '''
-    params = [origin, destination, departure_date.strftime('%d-%m-%Y'), travel_class]
-    cursor.execute(query, params)
-    flights = cursor.fetchall()
-
-    if not flights:
-        print(get_response("no_flights_found"))
-        query = '''
-        SELECT flight_number, origin, destination, departure_date, return_date, travel_class, price
-        FROM flights
-        WHERE origin = ? AND destination = ? AND departure_date > ?
-        ORDER BY departure_date ASC
-        LIMIT 1
-        '''
-        cursor.execute(query, [origin, destination, departure_date.strftime('%d-%m-%Y')])
-        flights = cursor.fetchall()
-
-    return flights
+# Describe a flight for the user
+def format_flight(flight):
+    return (f"Flight {flight[0]} from {flight[1]} to {flight[2]}, "
+            f"Departure: {format_db_date(flight[3])}, Return: {format_db_date(flight[4]) if flight[4] else 'One-way'}, "
+            f"Class: {flight[5]}, Price: ${flight[6]}")
+
+# Offer the earliest flight found, then the other results of the same search, and return the chosen flight
+def choose_flight(name, results):
+    flight = results["flights"][0]
+    yield f"Bot: I found one flight: \n\n{format_flight(flight)}\n"
+    yield get_response("confirmation_prompt")
+    confirm = (yield Ask(name)).strip().lower()
+    if confirm in ["yes", "y"]:
+        return flight
+
+    # Alternatives come from the results already fetched, so no further queries are needed
+    alternatives = results["flights"][1:]
+    if results["cheapest"] and results["cheapest"] not in results["flights"]:
+        alternatives.append(results["cheapest"])
+    if not alternatives:
+        return None
+
+    yield "Bot: Here are some alternatives:\n"
+    for number, alternative in enumerate(alternatives, 1):
+        yield f" {number}. {format_flight(alternative)}"
+    yield "\nBot: Reply with the number of the flight you'd like to book, or 'no' to stop."
+    choice = (yield Ask(name)).strip()
+    if choice.isdigit() and 1 <= int(choice) <= len(alternatives):
+        return alternatives[int(choice) - 1]
+    return None
 
 # Prompt user for missing booking details
 def prompt_for_missing_detail(detail_name, prompt_text, name, validation_func=None):
     while True:
-        print(f"{prompt_text}")
-        response = input(f"{name}: ").strip()
+        yield f"{prompt_text}"
+        response = (yield Ask(name)).strip()
         
         if detail_name in ["origin", "destination"]:
-            location_list = ORIGINS if detail_name == "origin" else DESTINATIONS
-            confirmed_location = confirm_location(response, location_list, name)
+            location_list = catalog.origins() if detail_name == "origin" else catalog.destinations()
+            confirmed_location = yield from confirm_location(response, location_list, name)
             if confirmed_location:
                 return confirmed_location
         
@@ -130,138 +147,151 @@ def prompt_for_missing_detail(detail_name, prompt_text, name, validation_func=No
         else:
             return response
         
-        print("Bot: Please enter a valid input.")
-
-# Save booking to the database
-def save_booking(conn, booking_details, name):
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO bookings (user_name, origin, destination, departure_date, return_date, flight_number, travel_class)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (
+        yield "Bot: Please enter a valid input."
+
+# Save booking to the database, taking a seat on the flight (or using the seat held by `hold_id`).
+# Returns False if the flight sold out first.
+@timed("save_booking")
+def save_booking(conn, booking_details, name, hold_id=None):
+    departure_date = to_db_date(booking_details["departure_date"])
+    key = (booking_details["origin"], booking_details["destination"], departure_date,
+           booking_details["travel_class"], booking_details["flight_number"])
+    return book_seat(conn, key, (
         name,
         booking_details["origin"],
         booking_details["destination"],
-        booking_details["departure_date"].strftime('%d-%m-%Y'),
-        booking_details.get("return_date").strftime('%d-%m-%Y') if booking_details.get("return_date") else None,
+        departure_date,
+        to_db_date(booking_details["return_date"]) if booking_details.get("return_date") else None,
         booking_details["flight_number"],
         booking_details["travel_class"]
-    ))
-    conn.commit()
+    ), hold_id)
 
-# PPrint out bookings for a specified user
+# Print out bookings for a specified user
 def display_bookings(name):
-    conn = connect_to_db()
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT flight_number, origin, destination, departure_date, travel_class
-        FROM bookings
-        WHERE user_name = ?
-        ORDER BY departure_date ASC
-    ''', (name,))
-    bookings = cursor.fetchall()
-    conn.close()
+    bookings = fetch_all("user_bookings", (name,))
 
     if not bookings:
-        print("Bot: You have no bookings at the moment.")
+        yield "Bot: You have no bookings at the moment."
         return None
 
-    print("Bot: Here are your current bookings:\n")
+    yield "Bot: Here are your current bookings:\n"
     for booking in bookings:
-        print(f"Flight: {booking[0]} from {booking[1]} to {booking[2]}, "
-              f"Departure: {booking[3]}, "
-              f"Class: {booking[4]}")
+        yield (f"Booking #{booking[0]}: Flight {booking[1]} from {booking[2]} to {booking[3]}, "
+               f"Departure: {format_db_date(booking[4])}, "
+               f"Class: {booking[5]}")
     return bookings
 
+# Find the booking a user picked, by booking number or by a flight number they booked only once
+def select_booking(bookings, choice):
+    choice = choice.lstrip("#")
+    if choice.isdigit():
+        return next((b for b in bookings if b[0] == int(choice)), None)
+    matching_bookings = [b for b in bookings if b[1].lower() == choice.lower()]
+    return matching_bookings[0] if len(matching_bookings) == 1 else None
+
 # Display bookings for a specified user and allow them to cancel a booking
 def display_and_cancel_booking(name):
-    bookings = display_bookings(name)
+    bookings = yield from display_bookings(name)
     if not bookings:
         return
 
-    print("\nBot: Would you like to cancel your bookings? (yes/no)")
-    confirm = input(f"{name}: ").strip().lower()
+    yield "\nBot: Would you like to cancel your bookings? (yes/no)"
+    confirm = (yield Ask(name)).strip().lower()
     if confirm not in ["yes", "y"]:
-        print("Bot: No problem, let me know if you need anything else.")
+        yield "Bot: No problem, let me know if you need anything else."
         return
 
-    print("Bot: Please enter the Flight Number of the booking you'd like to cancel:")
-    flight_number = input(f"{name}: ").strip()
-
-    matching_bookings = [b for b in bookings if b[0] == flight_number]
-    if not matching_bookings:
-        print("Bot: I couldn't find that flight in your bookings. Please try again.")
+    yield "Bot: Please enter the Booking Number of the booking you'd like to cancel:"
+    booking = select_booking(bookings, (yield Ask(name)).strip())
+    if not booking:
+        yield "Bot: I couldn't find that booking. Please try again."
         return
 
-    print(f"Bot: Are you sure you want to cancel the booking for Flight {flight_number}? (yes/no)")
-    final_confirm = input(f"{name}: ").strip().lower()
+    booking_id, flight_number = booking[0], booking[1]
+    yield f"Bot: Are you sure you want to cancel booking #{booking_id} for Flight {flight_number}? (yes/no)"
+    final_confirm = (yield Ask(name)).strip().lower()
     if final_confirm not in ["yes", "y"]:
-        print("Bot: Your booking was not canceled.")
+        yield "Bot: Your booking was not canceled."
         return
 
-    conn = connect_to_db()
-    cursor = conn.cursor()
-    cursor.execute('''
-        DELETE FROM bookings
-        WHERE user_name = ? AND flight_number = ?
-    ''', (name, flight_number))
-    conn.commit()
-    conn.close()
-
-    print(f"Bot: Your booking for Flight {flight_number} has been successfully canceled.")
-
+    if cancel_seat(get_connection(), name, booking_id):
+        yield f"Bot: Your booking for Flight {flight_number} has been successfully canceled."
+    else:
+        yield "Bot: That booking has already been canceled."
 
 # Main booking flow
 def booking_flow(name, user_input):
-    booking_details = parse_booking_details(user_input, {}, name)
+    booking_details = yield from parse_booking_details(user_input, {}, name)
 
     if not booking_details["origin"]:
-        booking_details["origin"] = prompt_for_missing_detail(
-            "origin", get_response("origin_prompt", available_origins=", ".join(ORIGINS)), name,
-            lambda x: best_match_location(x, ORIGINS)
+        booking_details["origin"] = yield from prompt_for_missing_detail(
+            "origin", get_response("origin_prompt", available_origins=", ".join(catalog.origins())), name,
+            lambda x: best_match_location(x, catalog.origins())
         )
 
     if not booking_details["destination"]:
-        booking_details["destination"] = prompt_for_missing_detail(
-            "destination", get_response("destination_prompt", available_destinations=", ".join(DESTINATIONS)), name,
-            lambda x: best_match_location(x, DESTINATIONS)
+        booking_details["destination"] = yield from prompt_for_missing_detail(
+            "destination", get_response("destination_prompt", available_destinations=", ".join(catalog.destinations())), name,
+            lambda x: best_match_location(x, catalog.destinations())
+        )
+
+    # Reject routes we don't fly before searching for flights
+    reachable = catalog.destinations_from(booking_details["origin"])
+    while reachable and not catalog.is_valid_route(booking_details["origin"], booking_details["destination"]):
+        booking_details["destination"] = yield from prompt_for_missing_detail(
+            "destination", get_response("route_unavailable", origin=booking_details["origin"],
+                                        destination=booking_details["destination"],
+                                        available_destinations=", ".join(reachable)), name,
+            lambda x: best_match_location(x, reachable)
         )
 
     if not booking_details["departure_date"]:
-        booking_details["departure_date"] = prompt_for_missing_detail(
-            "departure_date", get_response("departure_date_prompt"), name,
-            lambda x: parse_date(x)
+        dates = yield from prompt_for_missing_detail(
+            "departure_date", get_response("departure_date_prompt"), name, parse_departure_reply
         )
+        booking_details["departure_date"] = dates.departure
+        if dates.latest:
+            booking_details["latest_departure"] = dates.latest
 
     if not booking_details["travel_class"]:
-        booking_details["travel_class"] = prompt_for_missing_detail(
+        booking_details["travel_class"] = yield from prompt_for_missing_detail(
             "travel_class", get_response("travel_class_prompt"), name,
             lambda x: x.lower() if x.lower() in ["economy", "business", "first"] else None
         )
 
-    conn = connect_to_db()
-    flights = find_flights(
-        conn, 
-        booking_details["origin"], 
-        booking_details["destination"], 
-        booking_details["departure_date"], 
-        booking_details["travel_class"]
-    )
+    # Search the requested class over the requested date range (or the coming days), falling back to any class.
+    # Use the current thread's connection; the flow may resume on another thread after each prompt.
+    search_start = booking_details["departure_date"]
+    search_end = booking_details.get("latest_departure") or search_start + timedelta(days=SEARCH_WINDOW_DAYS)
+    route = (booking_details["origin"], booking_details["destination"])
+    with timer("find_flights"):
+        results = search_flights(get_connection(), *route, search_start, search_end, [booking_details["travel_class"]])
+        if not results["total"]:
+            results = search_flights(get_connection(), *route, search_start, search_end)
+    flights = results["flights"]
+
+    if flights and flights[0][3] != to_db_date(booking_details["departure_date"]):
+        yield get_response("no_flights_found")
 
     if flights:
-        flight = flights[0]
-        print(f"Bot: I found one flight: \n\nFlight {flight[0]} from {flight[1]} to {flight[2]}, "
-              f"Departure: {flight[3]}, Return: {flight[4] if flight[4] else 'One-way'}, "
-              f"Class: {flight[5]}, Price: ${flight[6]}\n")
-        print(get_response("confirmation_prompt"))
-        confirm = input(f"{name}: ")
-        if confirm in ["yes", "y"]:
+        # Hold a seat on the offered flight while the user decides; an abandoned hold expires by itself
+        hold_id = reserve_seat(get_connection(), flights[0], name)
+        flight = yield from choose_flight(name, results)
+        if hold_id is not None and flight != flights[0]:
+            release_hold(get_connection(), hold_id)
+            hold_id = None
+        if flight:
+            # Book the flight that was chosen, whose date and class may differ from the request
             booking_details["flight_number"] = flight[0]
-            print(get_response("booking_confirmed"))
-            save_booking(conn, booking_details, name)
+            booking_details["departure_date"] = datetime.strptime(flight[3], DB_DATE_FORMAT)
+            booking_details["return_date"] = datetime.strptime(flight[4], DB_DATE_FORMAT) if flight[4] else None
+            booking_details["travel_class"] = flight[5]
+            if save_booking(get_connection(), booking_details, name, hold_id):
+                yield get_response("booking_confirmed")
+            else:
+                yield get_response("flight_sold_out")
         else:
-            print("Bot: No problem, let me know if you need anything else.")
+            yield "Bot: No problem, let me know if you need anything else."
     else:
-        print("Bot: I couldn't find any flights matching your criteria.")
-
-    conn.close()
+        yield get_response("no_flights_found")
+        yield "Bot: I couldn't find any flights matching your criteria."
@@ -0,0 +1,59 @@
+from Classes.responses import get_response
+from Classes.intent_matching import match_intent, find_answer
+from Classes.booking_flow import booking_flow, display_and_cancel_booking
+from Classes.sentiment_analysis import sentiment_response
+from Classes.greeting import welcome_user
+from Classes.dialogue import Ask
+
+# Main conversation flow, shared by the terminal chatbot and the session server.
+# The name is None to start with a greeting, or the name the user already gave.
+def conversation(name=None):
+
+    # Begin infinite loop to handle continuous user interaction.
+    while True:
+        # If user's name is not yet set, prompt them with a welcome message.
+        if name is None:
+            name = yield from welcome_user()
+
+        # Capture user input for processing.
+        user_input = yield Ask(name)
+
+        answer = find_answer(user_input)
+        if answer:
+            yield f"Bot: {answer}"
+            continue
+
+        # Determine the user's intent based on the input.
+        intent = match_intent(user_input)
+
+        # Respond based on the matched intent.
+        if intent == "greeting":
+            # Provide a greeting response, incorporating the user's name.
+            yield get_response("greeting", name=name)
+        elif intent == "booking":
+            # Handle the booking flow for the user.
+            yield from booking_flow(name, user_input)
+        elif intent == "thanks":
+            # Respond to user expressions of gratitude.
+            yield get_response("thanks", name=name)
+        elif intent == "farewell":
+            # Respond to 'bye' related inputs and end the conversation.
+            yield get_response("farewell", name=name)
+            break
+        elif intent == "how_are_you":
+            # Respond to inquiries about the chatbot's state and analyse sentiment.
+            yield get_response("how_are_you")
+            user_response = yield Ask(name)
+            yield sentiment_response(user_response, name)
+        elif intent == "capabilities":
+            # Inform the user about the chatbot's capabilities.
+            yield get_response("capabilities")
+        elif intent == "user_name":
+            # Remind the user of their recorded name.
+            yield get_response("user_name", name=name)
+        elif intent == "edit_view_booking":
+            # Allow the user to edit or cancel an existing booking.
+            yield from display_and_cancel_booking(name)
+        else:
+            # Handle unrecognised inputs by prompting clarification.
+            yield "Bot: I'm not sure I understand. Could you please clarify?"
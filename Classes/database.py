@@ -0,0 +1,147 @@
+import os, sqlite3, threading
+
+DB_PATH = 'Resources/flight_booking.db'
+
+# Number of compiled statements each connection keeps; sqlite3 reuses them by SQL text
+STATEMENT_CACHE_SIZE = 128
+
+# Applied to every new connection. WAL lets readers keep reading flights while another
+# connection inserts bookings; NORMAL sync is safe under WAL and avoids an fsync per commit.
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "temp_store": "MEMORY",
+    "cache_size": -16000,
+    "mmap_size": 268435456,
+}
+
+# The fixed queries used while chatting. Keeping them as constants means each connection
+# compiles them once and reuses the prepared statement from its statement cache.
+QUERIES = {
+    # Users are found through the unique index on their name and bookings through (user_id, departure_date),
+    # so these are index seeks however many bookings there are.
+    "add_user": '''
+        INSERT INTO users (name) VALUES (?)
+        ON CONFLICT(name) DO NOTHING
+    ''',
+    "insert_booking": '''
+        INSERT INTO bookings (user_id, user_name, origin, destination, departure_date, return_date, flight_number, travel_class)
+        VALUES ((SELECT id FROM users WHERE name = ?1), ?1, ?2, ?3, ?4, ?5, ?6, ?7)
+    ''',
+    "user_bookings": '''
+        SELECT bookings.id, flight_number, origin, destination, departure_date, travel_class
+        FROM users JOIN bookings ON bookings.user_id = users.id
+        WHERE users.name = ?
+        ORDER BY departure_date ASC
+    ''',
+    "last_booking": '''
+        SELECT origin, destination, departure_date
+        FROM users JOIN bookings ON bookings.user_id = users.id
+        WHERE users.name = ?
+        ORDER BY departure_date DESC
+        LIMIT 1
+    ''',
+    "cancel_booking": '''
+        DELETE FROM bookings
+        WHERE id = ? AND user_id = (SELECT id FROM users WHERE name = ?)
+        RETURNING origin, destination, departure_date, travel_class, flight_number
+    ''',
+    # Seat inventory: every change is a single conditional update, so concurrent bookers can't oversell
+    "take_seat": '''
+        UPDATE flights SET seats_left = seats_left - 1
+        WHERE origin = ? AND destination = ? AND departure_date = ? AND travel_class = ? AND flight_number = ?
+          AND seats_left > 0
+        RETURNING id, departure_date, seats_left
+    ''',
+    "return_seat": '''
+        UPDATE flights SET seats_left = seats_left + 1
+        WHERE origin = ? AND destination = ? AND departure_date = ? AND travel_class = ? AND flight_number = ?
+        RETURNING departure_date, seats_left
+    ''',
+    "return_held_seat": '''
+        UPDATE flights SET seats_left = seats_left + 1
+        WHERE id = ?
+        RETURNING departure_date, seats_left
+    ''',
+    "insert_hold": '''
+        INSERT INTO holds (flight_id, user_name, expires_at)
+        VALUES (?, ?, ?)
+    ''',
+    "take_hold": '''
+        DELETE FROM holds
+        WHERE id = ? AND expires_at > ?
+        RETURNING flight_id
+    ''',
+    "release_hold": '''
+        DELETE FROM holds
+        WHERE id = ?
+        RETURNING flight_id
+    ''',
+    "expire_holds": '''
+        DELETE FROM holds
+        WHERE expires_at <= ?
+        RETURNING flight_id
+    ''',
+}
+
+# One persistent connection per thread
+_local = threading.local()
+
+# Open a new connection with the tuned settings, to DB_PATH unless another path is given
+def open_connection(path=None):
+    conn = sqlite3.connect(path or DB_PATH, timeout=PRAGMAS["busy_timeout"] / 1000, cached_statements=STATEMENT_CACHE_SIZE)
+    for pragma, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+    return conn
+
+# Return this thread's connection, opening it on first use
+def get_connection():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = open_connection()
+    return conn
+
+# SQLite connections must not be used on both sides of a fork, so forked children open their own
+def _forget_connections():
+    global _local
+    _local = threading.local()
+
+os.register_at_fork(after_in_child=_forget_connections)
+
+# Close this thread's connection, e.g. before a worker thread exits
+def close_connection():
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+# Read a value from the metadata table, or `default` if it isn't set (or the table doesn't exist yet)
+def get_metadata(key, default=None, conn=None):
+    conn = conn or get_connection()
+    try:
+        row = conn.execute("SELECT value FROM metadata WHERE key = ?", (key,)).fetchone()
+    except sqlite3.OperationalError:
+        return default
+    return row[0] if row else default
+
+# Write a value to the metadata table as part of the caller's transaction
+def set_metadata(conn, key, value):
+    conn.execute('''
+        INSERT INTO metadata (key, value) VALUES (?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value
+    ''', (key, value))
+
+# Run one of the fixed queries and return all rows
+def fetch_all(query_name, params=()):
+    return get_connection().execute(QUERIES[query_name], params).fetchall()
+
+# Run one of the fixed queries and return the first row
+def fetch_one(query_name, params=()):
+    return get_connection().execute(QUERIES[query_name], params).fetchone()
+
+# Run one of the fixed write queries in its own transaction
+def execute(query_name, params=()):
+    conn = get_connection()
+    with conn:
+        return conn.execute(QUERIES[query_name], params)
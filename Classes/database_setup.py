@@ -1,13 +1,50 @@
-import sqlite3
 from datetime import datetime, timedelta
-import random
+import argparse, csv, random, re, time
+from itertools import islice
+from Classes.date_parser import to_db_date, DB_DATE_FORMAT
+from Classes.database import get_connection, get_metadata, set_metadata
+from Classes.location_catalog import catalog, save_routes, save_locations, LOCATIONS_VERSION_KEY
+from Classes.search_cache import search_cache, MIN_DB_DATE
+from Classes.seat_inventory import SEAT_CAPACITY, DEFAULT_SEATS, with_seats
 
-def setup_database():
-    # Connect to the SQLite database (or create it if it doesn't exist).
-    conn = sqlite3.connect('Resources/flight_booking.db')
-    cursor = conn.cursor()
+# Number of rows inserted per executemany call when loading flights
+CHUNK_SIZE = 10000
+
+# Locations served when the database is first created; every origin flies to every destination
+DEFAULT_ORIGINS = ["London", "Toronto", "Sydney", "Dubai", "Frankfurt", "Mumbai"]
+DEFAULT_DESTINATIONS = ["Paris", "New York", "Berlin", "Singapore", "Tokyo", "Amsterdam"]
+
+# Number of days of flights kept bookable, starting from tomorrow
+INVENTORY_DAYS = 30
+
+# How setup_database seeds flights at startup:
+#   full        regenerate the whole window (the original behaviour)
+#   incremental append only the days after the stored watermark;
+#               writes nothing when the inventory is already current
+# Both prune flights that have already departed.
+#   skip        never write, so serving processes take no write lock at boot
+SEED_MODES = ("full", "incremental", "skip")
+
+# Metadata key holding the last departure date that has been generated
+WATERMARK_KEY = "flights_generated_until"
+
+# Columns of a flight schedule, in insert order
+FLIGHT_COLUMNS = ("flight_number", "origin", "destination", "departure_date", "return_date", "travel_class", "price")
 
-    # Create the flights table if it doesn't already exist.
+# Version of the database schema; bump it and extend migrate_database when the schema changes
+SCHEMA_VERSION = 7
+
+# Convert a 'DD-MM-YYYY' text column to ISO 'YYYY-MM-DD' in place
+def convert_dates_to_iso(cursor, table, column):
+    cursor.execute(f'''
+    UPDATE {table}
+    SET {column} = substr({column}, 7, 4) || '-' || substr({column}, 4, 2) || '-' || substr({column}, 1, 2)
+    WHERE {column} LIKE '__-__-____'
+    ''')
+
+# Create the flights and bookings tables if they don't already exist
+def create_tables(conn):
+    cursor = conn.cursor()
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS flights (
         id INTEGER PRIMARY KEY,
@@ -20,88 +57,380 @@ def setup_database():
         price REAL NOT NULL
     )
     ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS bookings (
+        id INTEGER PRIMARY KEY,
+        user_name TEXT NOT NULL,
+        origin TEXT NOT NULL,
+        destination TEXT NOT NULL,
+        departure_date TEXT NOT NULL,
+        return_date TEXT,
+        flight_number TEXT NOT NULL,
+        travel_class TEXT NOT NULL
+    )
+    ''')
     conn.commit()
 
-    # Function to generate flight data starting from tomorrow.
-    def generate_flight_data():
-        flight_data = []
-        tomorrow = datetime.now() + timedelta(days=1)
+# Bring an existing database up to the current schema version
+def migrate_database(conn):
+    cursor = conn.cursor()
+    version = cursor.execute('PRAGMA user_version').fetchone()[0]
 
-        origins = ["London", "Toronto", "Sydney", "Dubai", "Frankfurt", "Mumbai"]
-        destinations = ["Paris", "New York", "Berlin", "Singapore", "Tokyo", "Amsterdam"]
-        travel_classes = ["economy", "business", "first"]
-        base_price = 100  # Base price for economy class flights.
+    if version < 1:
+        # Store dates as ISO text so they order chronologically and can be range-scanned.
+        for table in ("flights", "bookings"):
+            convert_dates_to_iso(cursor, table, "departure_date")
+            convert_dates_to_iso(cursor, table, "return_date")
 
-        # Generate flight data for the next 30 days.
-        for destination in destinations:
-            for day in range(30):  # Flights are spread over the next 30 days.
-                # Randomly decide whether to create a flight for this day (50% chance).
-                if random.choice([True, False]):
-                    departure_date = (tomorrow + timedelta(days=day)).strftime('%d-%m-%Y')
-                    return_date = (tomorrow + timedelta(days=day + 7)).strftime('%d-%m-%Y')  # Return after 7 days.
-
-                    # Randomly select an origin that is not the same as the destination.
-                    origin = random.choice([o for o in origins if o != destination])
-
-                    # Randomly select travel classes for flight creation.
-                    selected_classes = random.sample(travel_classes, k=random.randint(1, len(travel_classes)))
-
-                    for travel_class in selected_classes:
-                        # Adjust the price based on the travel class.
-                        price_multiplier = 1.0 if travel_class == "economy" else (1.5 if travel_class == "business" else 2.0)
-                        price = base_price * price_multiplier + (day * 5)  # Slight increase for each day.
-
-                        # Generate a unique flight number.
-                        flight_number = f"{origin[:2].upper()}{destination[:2].upper()}{100 + day * len(travel_classes)}"
-
-                        # Append flight details to the data list.
-                        flight_data.append((flight_number, origin, destination, departure_date, return_date, travel_class, price))
-        
-        return flight_data
-
-    # Function to delete existing flights to avoid duplication.
-    def delete_existing_flights(cursor, flight_data):
-        for flight in flight_data:
-            _, origin, destination, departure_date, return_date, travel_class, _ = flight
-            cursor.execute('''
-            DELETE FROM flights
-            WHERE destination = ? AND departure_date = ? AND travel_class = ?
-            ''', (destination, departure_date, travel_class))
-
-    # Function to create the bookings table if it doesn't exist.
-    def create_bookings_table():
-        # Connect to the SQLite database (or create it if it doesn't exist).
-        conn = sqlite3.connect('Resources/flight_booking.db')
-        cursor = conn.cursor()
-
-        # Create the bookings table if it doesn't already exist.
+        # Covering index for flight searches: every searched and returned column is in the index,
+        # so both the exact-date search and the next-available range query are index-only seeks.
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_flights_search
+        ON flights (origin, destination, departure_date, travel_class, flight_number, return_date, price)
+        ''')
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_bookings_user
+        ON bookings (user_name, departure_date)
+        ''')
+
+    if version < 2:
+        # Lets inventory loads replace a date window with one range delete.
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_flights_departure
+        ON flights (departure_date)
+        ''')
+
+    if version < 3:
+        # Key/value store for the inventory watermark and other bookkeeping.
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS metadata (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+        ''')
+
+    if version < 4:
+        # Locations and the routes between them, so route knowledge lives in the database.
         cursor.execute('''
-        CREATE TABLE IF NOT EXISTS bookings (
+        CREATE TABLE IF NOT EXISTS locations (
             id INTEGER PRIMARY KEY,
-            user_name TEXT NOT NULL,
+            name TEXT NOT NULL UNIQUE,
+            iata TEXT,
+            aliases TEXT
+        )
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS routes (
             origin TEXT NOT NULL,
             destination TEXT NOT NULL,
-            departure_date TEXT NOT NULL,
-            return_date TEXT,
-            flight_number TEXT NOT NULL,
-            travel_class TEXT NOT NULL
+            active INTEGER NOT NULL DEFAULT 1,
+            version INTEGER NOT NULL,
+            PRIMARY KEY (origin, destination)
+        ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_routes_version
+        ON routes (version)
+        ''')
+        cursor.executemany("INSERT OR IGNORE INTO locations (name) VALUES (?)",
+                           [(name,) for name in DEFAULT_ORIGINS + DEFAULT_DESTINATIONS])
+        save_routes(conn, [(origin, destination) for origin in DEFAULT_ORIGINS for destination in DEFAULT_DESTINATIONS])
+
+    if version < 5:
+        # Seats left per flight and class, counting the bookings already made, and short-lived seat holds.
+        seats = " ".join(f"WHEN '{travel_class}' THEN {count}" for travel_class, count in SEAT_CAPACITY.items())
+        cursor.execute("ALTER TABLE flights ADD COLUMN seats_left INTEGER NOT NULL DEFAULT 0")
+        cursor.execute(f'''
+        UPDATE flights SET seats_left = MAX(0, CASE travel_class {seats} ELSE {DEFAULT_SEATS} END - (
+            SELECT COUNT(*) FROM bookings
+            WHERE bookings.flight_number = flights.flight_number
+              AND bookings.departure_date = flights.departure_date
+              AND bookings.travel_class = flights.travel_class
+        ))
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS holds (
+            id INTEGER PRIMARY KEY,
+            flight_id INTEGER NOT NULL,
+            user_name TEXT NOT NULL,
+            expires_at REAL NOT NULL
         )
         ''')
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_holds_expiry
+        ON holds (expires_at)
+        ''')
+        # Searches skip sold-out flights, so the covering search index needs the seat count too.
+        cursor.execute("DROP INDEX IF EXISTS idx_flights_search")
+        cursor.execute('''
+        CREATE INDEX idx_flights_search
+        ON flights (origin, destination, departure_date, travel_class, flight_number, return_date, price, seats_left)
+        ''')
+
+    if version < 6:
+        # Users get their own table and bookings point at them by id, so a user's bookings are one index seek.
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+        ''')
+        cursor.execute("ALTER TABLE bookings ADD COLUMN user_id INTEGER REFERENCES users (id)")
+        cursor.execute("INSERT OR IGNORE INTO users (name) SELECT DISTINCT user_name FROM bookings")
+        cursor.execute("UPDATE bookings SET user_id = (SELECT id FROM users WHERE users.name = bookings.user_name)")
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_bookings_user_id
+        ON bookings (user_id, departure_date)
+        ''')
+        cursor.execute("DROP INDEX IF EXISTS idx_bookings_user")
+
+    if version < 7:
+        # Any change to a location bumps a change number, so catalogs pick up new IATA codes and aliases
+        # even when no route changed.
+        cursor.execute("INSERT OR IGNORE INTO metadata (key, value) VALUES (?, '0')", (LOCATIONS_VERSION_KEY,))
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS locations_{event.lower()}_version AFTER {event} ON locations
+            BEGIN
+                UPDATE metadata SET value = value + 1 WHERE key = '{LOCATIONS_VERSION_KEY}';
+            END
+            ''')
+
+    if version < SCHEMA_VERSION:
+        cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
         conn.commit()
 
-    # Generate flight data for the next 30 days.
-    flight_data = generate_flight_data()
-    create_bookings_table()
+# Generate flight data for `days` days, starting `first_day` days after `start_date`.
+# Rows are produced lazily so very large synthetic schedules can be streamed into the database.
+def generate_flight_data(start_date, days=INVENTORY_DAYS, flights_per_day=1, first_day=0):
+    # Routes come from the location catalog.
+    destinations = catalog.destinations()
+    origins_to = {destination: [origin for origin in catalog.origins() if catalog.is_valid_route(origin, destination)]
+                  for destination in destinations}
+    travel_classes = ["economy", "business", "first"]
+    base_price = 100  # Base price for economy class flights.
 
-    # Remove duplicate flights from the database before inserting new data.
-    delete_existing_flights(cursor, flight_data)
+    for destination in destinations:
+        for day in range(first_day, first_day + days):
+            departure_date = to_db_date(start_date + timedelta(days=day))
+            return_date = to_db_date(start_date + timedelta(days=day + 7))  # Return after 7 days.
 
-    # Insert the generated flight data into the flights table.
-    cursor.executemany('''
-    INSERT INTO flights (flight_number, origin, destination, departure_date, return_date, travel_class, price)
-    VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', flight_data)
-    conn.commit()
+            for departure in range(flights_per_day):
+                # Randomly decide whether to create a flight for this day (50% chance).
+                if not random.choice([True, False]):
+                    continue
+
+                # Randomly select an origin that flies to this destination.
+                origin = random.choice(origins_to[destination])
+
+                # Randomly select travel classes for flight creation.
+                selected_classes = random.sample(travel_classes, k=random.randint(1, len(travel_classes)))
+
+                for travel_class in selected_classes:
+                    # Adjust the price based on the travel class.
+                    price_multiplier = 1.0 if travel_class == "economy" else (1.5 if travel_class == "business" else 2.0)
+                    price = base_price * price_multiplier + (day * 5)  # Slight increase for each day.
+
+                    # Generate a flight number, unique per route, day and departure.
+                    flight_number = f"{origin[:2].upper()}{destination[:2].upper()}{100 + day * len(travel_classes) + departure * 100000}"
+
+                    yield (flight_number, origin, destination, departure_date, return_date, travel_class, price)
+
+# Split an iterable of rows into lists of at most `size` rows
+def chunked(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+# Remove the flights departing in a date window, together with any seats held on them
+def clear_window(conn, window):
+    conn.execute("DELETE FROM holds WHERE flight_id IN (SELECT id FROM flights WHERE departure_date BETWEEN ? AND ?)", window)
+    conn.execute("DELETE FROM flights WHERE departure_date BETWEEN ? AND ?", window)
+
+# Take the seats of existing bookings out of freshly loaded flights
+def restore_booked_seats(conn, window):
+    conn.execute('''
+    UPDATE flights SET seats_left = MAX(0, seats_left - (
+        SELECT COUNT(*) FROM bookings
+        WHERE bookings.flight_number = flights.flight_number
+          AND bookings.departure_date = flights.departure_date
+          AND bookings.travel_class = flights.travel_class
+    ))
+    WHERE departure_date BETWEEN ? AND ?
+      AND EXISTS (SELECT 1 FROM bookings WHERE bookings.departure_date = flights.departure_date)
+    ''', window)
+
+# Replace every flight departing in a date window with new rows, in a single transaction.
+# If no window is given it is taken from the rows themselves, which are staged in a temporary table first.
+# Each flight starts with its class's seat capacity, less any bookings already made on it.
+# Returns the number of rows loaded and the load rate.
+def load_flights(conn, rows, window=None, chunk_size=CHUNK_SIZE):
+    columns = ", ".join(FLIGHT_COLUMNS + ("seats_left",))
+    placeholders = ", ".join("?" for _ in FLIGHT_COLUMNS + ("seats_left",))
+    rows = with_seats(rows)
+    started = time.perf_counter()
+    loaded = 0
+
+    with conn:
+        if window is not None:
+            # The window is known, so clear it with one range delete and stream the rows straight in.
+            clear_window(conn, window)
+            for chunk in chunked(rows, chunk_size):
+                conn.executemany(f"INSERT INTO flights ({columns}) VALUES ({placeholders})", chunk)
+                loaded += len(chunk)
+        else:
+            conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS staged_flights AS SELECT {columns} FROM flights WHERE 0")
+            conn.execute("DELETE FROM staged_flights")
+            for chunk in chunked(rows, chunk_size):
+                conn.executemany(f"INSERT INTO staged_flights ({columns}) VALUES ({placeholders})", chunk)
+                loaded += len(chunk)
+
+            window = conn.execute("SELECT min(departure_date), max(departure_date) FROM staged_flights").fetchone()
+            clear_window(conn, window)
+            # Insert in search-index order so the index is built with sequential page writes.
+            conn.execute(f'''
+            INSERT INTO flights ({columns})
+            SELECT {columns} FROM staged_flights
+            ORDER BY origin, destination, departure_date, travel_class
+            ''')
+            conn.execute("DELETE FROM staged_flights")
+        restore_booked_seats(conn, window)
+
+    # Cached searches over the replaced days are now stale
+    if window[0] is not None:
+        search_cache.invalidate(*window)
+
+    elapsed = time.perf_counter() - started
+    return {"rows": loaded, "seconds": elapsed, "rows_per_second": loaded / elapsed if elapsed else float("inf")}
+
+# Convert a schedule date to the stored ISO format, accepting DD-MM-YYYY as well
+def normalise_schedule_date(value):
+    if not value:
+        return None
+    if re.fullmatch(r"\d{2}-\d{2}-\d{4}", value):
+        return to_db_date(datetime.strptime(value, '%d-%m-%Y'))
+    return value
+
+# Stream flight rows from a CSV or Parquet schedule with the FLIGHT_COLUMNS columns
+def read_schedule(path, chunk_size=CHUNK_SIZE):
+    if path.endswith(".parquet"):
+        # Parquet support is optional and only needs pyarrow when such a file is loaded.
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=list(FLIGHT_COLUMNS)):
+            for row in batch.to_pylist():
+                yield (row["flight_number"], row["origin"], row["destination"],
+                       normalise_schedule_date(str(row["departure_date"])),
+                       normalise_schedule_date(row["return_date"] and str(row["return_date"])),
+                       row["travel_class"], float(row["price"]))
+        return
+
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            yield (row["flight_number"], row["origin"], row["destination"],
+                   normalise_schedule_date(row["departure_date"]), normalise_schedule_date(row.get("return_date")),
+                   row["travel_class"], float(row["price"]))
+
+# Read (name, iata, aliases) rows from a gazetteer CSV with `name`, `iata` and `aliases` (separated by '|') columns
+def read_gazetteer(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return [(row["name"], row.get("iata") or None, [alias for alias in (row.get("aliases") or "").split("|") if alias])
+                for row in csv.DictReader(f)]
+
+# Record that flights are loaded up to `day`. The watermark only moves forward, so loading a shorter
+# window never hides days a longer schedule already loaded from the incremental seed.
+def advance_watermark(conn, day):
+    watermark = get_metadata(WATERMARK_KEY, conn=conn)
+    set_metadata(conn, WATERMARK_KEY, max(watermark or day, day))
+
+# Prepare the database and seed the flight inventory using one of SEED_MODES.
+# Returns the load statistics, or None if nothing needed to be written.
+def setup_database(seed="full"):
+    if seed not in SEED_MODES:
+        raise ValueError(f"Unknown seed mode '{seed}', expected one of {', '.join(SEED_MODES)}")
+    if seed == "skip":
+        return None
+
+    # Use this thread's shared connection to the SQLite database (created if it doesn't exist).
+    conn = get_connection()
+
+    # Create the tables, convert older databases and create the search indexes.
+    create_tables(conn)
+    migrate_database(conn)
+    catalog.refresh(force=True)
+
+    # Flights are kept for the next INVENTORY_DAYS days, starting from tomorrow.
+    today = datetime.now()
+    tomorrow = today + timedelta(days=1)
+    window_end = to_db_date(tomorrow + timedelta(days=INVENTORY_DAYS - 1))
+
+    # Prune departed flights in every seed mode, but only write if something has departed.
+    expired = conn.execute("SELECT 1 FROM flights WHERE departure_date < ? LIMIT 1", (to_db_date(today),)).fetchone()
+    if expired:
+        departed = (MIN_DB_DATE, to_db_date(today - timedelta(days=1)))
+        with conn:
+            clear_window(conn, departed)
+        search_cache.invalidate(*departed)
+
+    first_day = 0
+    watermark = get_metadata(WATERMARK_KEY, conn=conn)
+    if seed == "incremental" and watermark:
+        # Only generate the days after the watermark.
+        first_day = max(0, (datetime.strptime(watermark, DB_DATE_FORMAT).date() - tomorrow.date()).days + 1)
+        if first_day >= INVENTORY_DAYS:
+            return None
+
+    stats = None
+    if first_day < INVENTORY_DAYS:
+        window = (to_db_date(tomorrow + timedelta(days=first_day)), window_end)
+        rows = generate_flight_data(tomorrow, INVENTORY_DAYS - first_day, first_day=first_day)
+        stats = load_flights(conn, rows, window)
+
+    with conn:
+        advance_watermark(conn, window_end)
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load flight inventory into the database.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    load_parser = commands.add_parser("load", help="load a CSV or Parquet schedule, replacing its date window")
+    load_parser.add_argument("path")
+    generate_parser = commands.add_parser("generate", help="generate a synthetic schedule starting tomorrow")
+    generate_parser.add_argument("--days", type=int, default=30)
+    generate_parser.add_argument("--flights-per-day", type=int, default=1)
+    locations_parser = commands.add_parser("locations", help="add locations or update their IATA codes and aliases "
+                                                             "from a gazetteer CSV")
+    locations_parser.add_argument("path")
+    route_parser = commands.add_parser("route", help="add or withdraw a route")
+    route_parser.add_argument("origin")
+    route_parser.add_argument("destination")
+    route_parser.add_argument("--withdraw", action="store_true")
+    for command_parser in (load_parser, generate_parser):
+        command_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
 
-    # Close the database connection.
-    conn.close()
+    conn = get_connection()
+    create_tables(conn)
+    migrate_database(conn)
+    catalog.refresh(force=True)
+    if args.command == "route":
+        with conn:
+            save_routes(conn, [(args.origin, args.destination)], active=not args.withdraw)
+        print(f"{'Withdrew' if args.withdraw else 'Added'} route {args.origin} -> {args.destination}")
+        raise SystemExit(0)
+    if args.command == "locations":
+        rows = read_gazetteer(args.path)
+        with conn:
+            save_locations(conn, rows)
+        print(f"Saved {len(rows)} locations")
+        raise SystemExit(0)
+    if args.command == "load":
+        stats = load_flights(conn, read_schedule(args.path, args.chunk_size), chunk_size=args.chunk_size)
+    else:
+        start = datetime.now() + timedelta(days=1)
+        window = (to_db_date(start), to_db_date(start + timedelta(days=args.days - 1)))
+        rows = generate_flight_data(start, args.days, args.flights_per_day)
+        stats = load_flights(conn, rows, window, chunk_size=args.chunk_size)
+        with conn:
+            advance_watermark(conn, window[1])
+    print(f"Loaded {stats['rows']} flights in {stats['seconds']:.2f}s ({stats['rows_per_second']:,.0f} rows/sec)")
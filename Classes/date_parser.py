@@ -1,5 +1,8 @@
 import re
-from datetime import datetime, timedelta
+from calendar import monthrange
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
 
 weekdays = {
         'monday': 0,
@@ -11,12 +14,71 @@ weekdays = {
         'sunday': 6,
     }
 
-def get_weekday_date(weekday_name, nextFlag):
+# Dates are stored in the database as ISO text so they sort and range-scan correctly,
+# and shown to users in day-month-year order
+DB_DATE_FORMAT = '%Y-%m-%d'
+DISPLAY_DATE_FORMAT = '%d-%m-%Y'
+
+# Convert a datetime to the format stored in the database
+def to_db_date(date):
+    return date.strftime(DB_DATE_FORMAT)
+
+# Convert a stored date into the format shown to users
+def format_db_date(db_date):
+    if not db_date:
+        return db_date
+    return datetime.strptime(db_date, DB_DATE_FORMAT).strftime(DISPLAY_DATE_FORMAT)
+
+# Month names and abbreviations accepted in dates
+months = {
+        'january': 1, 'jan': 1, 'february': 2, 'feb': 2, 'march': 3, 'mar': 3,
+        'april': 4, 'apr': 4, 'may': 5, 'june': 6, 'jun': 6, 'july': 7, 'jul': 7,
+        'august': 8, 'aug': 8, 'september': 9, 'sept': 9, 'sep': 9,
+        'october': 10, 'oct': 10, 'november': 11, 'nov': 11, 'december': 12, 'dec': 12,
+    }
+
+# Named days and counts written as words
+named_days = {'today': 0, 'tomorrow': 1, 'day after tomorrow': 2, 'next week': 7}
+counts = {'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7}
+
+# Number of recently parsed (text, day) pairs remembered
+PARSE_CACHE_SIZE = 1024
+
+# Dates found in an utterance: the departure date, the last acceptable departure date
+# when a range was given, and the return date
+TravelDates = namedtuple('TravelDates', ['departure', 'latest', 'return_date'])
+
+def alternation(words):
+    return "|".join(sorted(map(re.escape, words), key=len, reverse=True))
+
+MONTH = alternation(months)
+WEEKDAY = alternation(weekdays)
+ORDINAL = r"(?:st|nd|rd|th)"
+
+# The date grammar: one named alternative per kind of date, tried left to right in a single scan
+DATE_PATTERNS = {
+    "iso": r"(?P<iso_year>\d{4})-(?P<iso_month>\d{1,2})-(?P<iso_day>\d{1,2})",
+    "numeric": r"(?P<num_day>\d{1,2})[-/.](?P<num_month>\d{1,2})[-/.](?P<num_year>\d{4}|\d{2})",
+    "day_month": rf"(?:the\s+)?(?P<dm_day>\d{{1,2}}){ORDINAL}?(?:\s+of)?\s+(?P<dm_month>{MONTH})(?:,?\s+(?P<dm_year>\d{{4}}))?",
+    "month_day": rf"(?P<md_month>{MONTH})\s+(?:the\s+)?(?P<md_day>\d{{1,2}}){ORDINAL}?(?:,?\s+(?P<md_year>\d{{4}}))?",
+    "day_of_month": rf"the\s+(?P<dom_day>\d{{1,2}}){ORDINAL}",
+    "named": rf"(?P<named_day>{alternation(named_days)})",
+    "offset": rf"in\s+(?P<offset_count>\d+|{alternation(counts)})\s+(?P<offset_unit>days?|weeks?)",
+    "weekday": rf"(?P<weekday_next>next\s+)?(?P<weekday_name>{WEEKDAY})",
+}
+DATE_GRAMMAR = re.compile(r"\b(?:" + "|".join(f"(?P<{kind}>{pattern})" for kind, pattern in DATE_PATTERNS.items()) + r")\b")
+
+# Words between dates that make the later one a return date, or the end of a range
+RETURN_MARKER = re.compile(r"\b(?:return(?:ing)?|back|coming back)\b")
+RANGE_MARKER = re.compile(r"^\s*(?:and|to|until|till|-)\s*$")
+RANGE_START = re.compile(r"\b(?:between|from)\s*$")
+
+def get_weekday_date(weekday_name, nextFlag, today=None):
     weekday_name = weekday_name.lower()
     if weekday_name not in weekdays:
         return None  # Return None for invalid weekday names
 
-    today = datetime.now()
+    today = today or date.today()
     target_weekday = weekdays[weekday_name]
     current_weekday = today.weekday()
     
@@ -29,33 +91,79 @@ def get_weekday_date(weekday_name, nextFlag):
     
     return today + timedelta(days=days_until_next_weekday)
 
-# Function to convert various formats of date inputs into a datetime object
-def parse_date(input_text):
-    reference_date = datetime.now()
-
-    try:
-        # Handle specific phrases
-        if "tomorrow" in input_text:
-            return reference_date + timedelta(days=1)
-        elif "next week" in input_text:
-            return reference_date + timedelta(weeks=1)
-        elif "in " in input_text and " days" in input_text:
-            days = int(re.search(r'in (\d+) days', input_text).group(1))
-            return reference_date + timedelta(days=days)
-        
-        # Handle 'next' weekdays
-        match = re.match(r'next (\w+)', input_text.lower())
-        if match:
-            weekday_name = match.group(1)
-            return get_weekday_date(weekday_name, True)
-        # Handle weekdays without 'next'
-        for weekday in weekdays:
-            if weekday in input_text.lower():
-                return get_weekday_date(weekday, False)
-
-        # Handle specific date format 
-        return datetime.strptime(input_text, '%d-%m-%Y')
-    except (ValueError, AttributeError):
-        return None  # Return None for invalid input
+# The next date after today falling on a day of the month, skipping months that are too short
+def next_day_of_month(day, today):
+    year, month = today.year, today.month
+    if day <= today.day:
+        month += 1
+    for _ in range(12):
+        if month > 12:
+            year, month = year + 1, 1
+        if day <= monthrange(year, month)[1]:
+            return date(year, month, day)
+        month += 1
+    return None
+
+# A day and month without a year mean their next occurrence from today
+def day_and_month(day, month, year, today):
+    if year:
+        return date(int(year), month, day)
+    candidate = date(today.year, month, day)
+    return candidate if candidate >= today else date(today.year + 1, month, day)
 
+# Turn one grammar match into a date
+def match_date(match, today):
+    kind = match.lastgroup
+    if kind == "iso":
+        return date(int(match["iso_year"]), int(match["iso_month"]), int(match["iso_day"]))
+    if kind == "numeric":
+        year = int(match["num_year"])
+        return date(year + 2000 if year < 100 else year, int(match["num_month"]), int(match["num_day"]))
+    if kind == "day_month":
+        return day_and_month(int(match["dm_day"]), months[match["dm_month"]], match["dm_year"], today)
+    if kind == "month_day":
+        return day_and_month(int(match["md_day"]), months[match["md_month"]], match["md_year"], today)
+    if kind == "day_of_month":
+        return next_day_of_month(int(match["dom_day"]), today)
+    if kind == "named":
+        return today + timedelta(days=named_days[match["named_day"]])
+    if kind == "offset":
+        count = match["offset_count"]
+        count = int(count) if count.isdigit() else counts[count]
+        return today + timedelta(days=count * (7 if match["offset_unit"].startswith("week") else 1))
+    return get_weekday_date(match["weekday_name"], bool(match["weekday_next"]), today)
 
+# Scan the text once, reading each date in order along with the words between them
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def scan_travel_dates(text, today):
+    departure = latest = return_date = None
+    in_range = False
+    previous_end = 0
+    for match in DATE_GRAMMAR.finditer(text):
+        try:
+            found = match_date(match, today)
+        except ValueError:
+            found = None
+        gap = text[previous_end:match.start()]
+        previous_end = match.end()
+        if found is None:
+            continue
+        if departure is None:
+            departure = found
+            in_range = bool(RANGE_START.search(gap))
+        elif in_range and latest is None and RANGE_MARKER.match(gap):
+            latest = found
+        elif return_date is None and (RETURN_MARKER.search(gap) or RANGE_MARKER.match(gap)):
+            return_date = found
+
+    as_datetime = lambda day: datetime.combine(day, time()) if day else None
+    return TravelDates(as_datetime(departure), as_datetime(latest), as_datetime(return_date))
+
+# Find the departure date, the end of a date range ("between X and Y") and the return date in an utterance.
+# Results are cached per text and day, so re-parsing the same reply while filling slots is free.
+def parse_travel_dates(input_text, today=None):
+    return scan_travel_dates(input_text.lower(), today or date.today())
+
+# Function to convert various formats of date inputs into a datetime object
+def parse_date(input_text, today=None):
+    return parse_travel_dates(input_text, today).departure
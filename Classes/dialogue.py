@@ -0,0 +1,64 @@
+from collections import namedtuple
+
+# Conversation flows are generators. They yield strings for the bot to say and yield an
+# Ask when they need the user's next message, which is sent back into the generator:
+#
+#     yield "Bot: Where would you like to go?"
+#     reply = yield Ask(name)
+#
+# This lets the same flow run in a blocking terminal or be resumed one message at a time.
+Ask = namedtuple('Ask', ['label'])
+
+# Drive a flow with print() and input(), returning the flow's result
+def run_in_terminal(flow):
+    try:
+        event = next(flow)
+        while True:
+            if isinstance(event, Ask):
+                event = flow.send(input(f"{event.label}: "))
+            else:
+                print(event)
+                event = next(flow)
+    except StopIteration as stop:
+        return stop.value
+
+# A flow that is advanced one incoming message at a time
+class Session:
+    def __init__(self, flow):
+        self.flow = flow
+        self.started = False
+        self.finished = False
+
+    # Run the flow until it next asks for input, collecting everything it says on the way
+    def _advance(self, message):
+        replies = []
+        try:
+            event = self.flow.send(message) if self.started else next(self.flow)
+            self.started = True
+            while not isinstance(event, Ask):
+                replies.append(event)
+                event = next(self.flow)
+        except StopIteration:
+            self.finished = True
+        return replies
+
+    # Start the flow, returning its opening messages
+    def start(self):
+        if self.started:
+            return []
+        return self._advance(None)
+
+    # Feed the user's message to the flow and return the bot's replies
+    def send(self, message):
+        if self.finished:
+            return []
+        if not self.started:
+            self.start()
+            if self.finished:
+                return []
+        return self._advance(message)
+
+    # Abandon the flow, running any cleanup it has pending
+    def close(self):
+        self.flow.close()
+        self.finished = True
@@ -0,0 +1,157 @@
+import re, threading
+from collections import deque, namedtuple
+from Classes.location_catalog import catalog
+from Classes.preprocessing import tokenize
+
+# A phrase found in an utterance: its kind ("location", "class" or "date"), canonical value and token span
+Entity = namedtuple('Entity', ['kind', 'value', 'start', 'end'])
+
+# Keywords naming a travel class
+CLASS_PHRASES = {
+    "economy": "economy",
+    "economy class": "economy",
+    "business": "business",
+    "business class": "business",
+    "first": "first",
+    "first class": "first",
+}
+
+# Date phrases, recognised so that words like "to tomorrow" aren't taken for places;
+# "#num" and "#date" stand for any number and any DD-MM-YYYY token
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+DATE_PHRASES = ["tomorrow", "next week", "in #num days", "#date", *WEEKDAYS, *(f"next {day}" for day in WEEKDAYS)]
+
+# Words that mark the following location as the origin or the destination
+ROLE_MARKERS = {"from": "origin", "to": "destination"}
+
+NUMBER_TOKEN = re.compile(r"\d+")
+DATE_TOKEN = re.compile(r"\d{1,2}-\d{1,2}-\d{4}")
+
+# Map a token to the symbol the automaton matches on
+def token_symbol(token):
+    if NUMBER_TOKEN.fullmatch(token):
+        return "#num"
+    if DATE_TOKEN.fullmatch(token):
+        return "#date"
+    return token
+
+# Aho-Corasick automaton over token sequences.
+# Every phrase is found in a single left-to-right pass, however many phrases there are.
+class PhraseAutomaton:
+    def __init__(self, phrases):
+        # phrases are (tokens, kind, value) triples
+        self.goto = [{}]
+        self.outputs = [[]]
+        for tokens, kind, value in phrases:
+            state = 0
+            for symbol in tokens:
+                if symbol not in self.goto[state]:
+                    self.goto.append({})
+                    self.outputs.append([])
+                    self.goto[state][symbol] = len(self.goto) - 1
+                state = self.goto[state][symbol]
+            self.outputs[state].append((len(tokens), kind, value))
+        self._build_failure_links()
+
+    # Breadth-first pass linking each state to the state for its longest proper suffix
+    def _build_failure_links(self):
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for symbol, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and symbol not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(symbol, 0)
+                self.outputs[child] += self.outputs[self.fail[child]]
+
+    # All phrase occurrences in a token sequence, as Entity spans
+    def scan(self, tokens):
+        state = 0
+        found = []
+        for end, token in enumerate(tokens, 1):
+            symbol = token_symbol(token)
+            while state and symbol not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(symbol, 0)
+            for length, kind, value in self.outputs[state]:
+                found.append(Entity(kind, value, end - length, end))
+        return found
+
+    # Non-overlapping occurrences, preferring the leftmost and then the longest phrase
+    def extract(self, tokens):
+        entities = []
+        position = 0
+        for entity in sorted(self.scan(tokens), key=lambda e: (e.start, e.start - e.end)):
+            if entity.start >= position:
+                entities.append(entity)
+                position = entity.end
+        return entities
+
+# Build the automaton for the current locations, class keywords and date phrases
+def build_automaton(locations, aliases):
+    phrases = [(tokenize(name), "location", name) for name in locations]
+    phrases += [(tokenize(alias), "location", name) for name, names in aliases.items() if name in locations
+                for alias in names]
+    phrases += [(phrase.split(), "class", value) for phrase, value in CLASS_PHRASES.items()]
+    phrases += [(phrase.split(), "date", phrase) for phrase in DATE_PHRASES]
+    return PhraseAutomaton(phrase for phrase in phrases if phrase[0])
+
+# The automaton is rebuilt only when the catalog's routes change
+_automaton = (None, None)
+_automaton_lock = threading.Lock()
+
+def get_automaton():
+    global _automaton
+    catalog.refresh()
+    version, automaton = _automaton
+    if version != catalog.version:
+        with _automaton_lock:
+            locations = set(catalog.origins()) | set(catalog.destinations())
+            automaton = build_automaton(locations, catalog.aliases)
+            _automaton = (catalog.version, automaton)
+    return automaton
+
+# Extract booking entities from an utterance's tokens in one pass.
+# Returns the travel class and the origin and destination (using "from"/"to" where given,
+# otherwise in the order mentioned). Words after "from" or "to"
+# that aren't a known location are returned under "unmatched", longest first, for fuzzy matching.
+def extract_booking_entities(tokens):
+    found = {"origin": None, "destination": None, "travel_class": None, "unmatched": {}}
+    unassigned = []
+    entities = get_automaton().extract(tokens)
+    for entity in entities:
+        role = ROLE_MARKERS.get(tokens[entity.start - 1]) if entity.start else None
+        if entity.kind == "class":
+            found["travel_class"] = found["travel_class"] or entity.value
+        elif entity.kind == "date":
+            continue
+        elif role and not found[role]:
+            found[role] = entity.value
+        else:
+            unassigned.append(entity.value)
+
+    # Locations mentioned without "from"/"to" fill the origin first, if they are flown from
+    for location in unassigned:
+        if not found["origin"] and location in catalog.origins():
+            found["origin"] = location
+        elif not found["destination"] and location in catalog.destinations():
+            found["destination"] = location
+
+    starts = {entity.start for entity in entities}
+    for index, token in enumerate(tokens):
+        role = ROLE_MARKERS.get(token)
+        if not role or found[role]:
+            continue
+        following = []
+        for position in range(index + 1, min(index + 3, len(tokens))):
+            if position in starts or not tokens[position].isalpha() or tokens[position] in ROLE_MARKERS:
+                break
+            following.append(tokens[position])
+        candidates = [" ".join(following)] if len(following) == 2 else []
+        if following and len(following[0]) >= 4:
+            candidates.append(following[0])
+        found["unmatched"].setdefault(role, []).extend(candidates)
+    return found
@@ -0,0 +1,90 @@
+import math
+from datetime import datetime, timedelta
+from Classes.date_parser import to_db_date, DB_DATE_FORMAT
+from Classes.search_cache import cached_search
+from Classes.metrics import timed
+
+# Columns returned for each flight, in the order format_flight and the booking flow index them
+FLIGHT_FIELDS = "flight_number, origin, destination, departure_date, return_date, travel_class, price"
+
+# Orderings available for search results
+SORT_ORDERS = {
+    "price": "price ASC, departure_date ASC, flight_number ASC",
+    "date": "departure_date ASC, price ASC, flight_number ASC",
+}
+
+# Shared WHERE clause for a route, date window and optional class and price filters.
+# Sold-out flights are never returned.
+def search_filter(origin, destination, start_date, end_date, travel_classes=None, max_price=None):
+    clauses = ["origin = ?", "destination = ?", "departure_date BETWEEN ? AND ?", "seats_left > 0"]
+    params = [origin, destination, to_db_date(start_date), to_db_date(end_date)]
+    if travel_classes:
+        clauses.append(f"travel_class IN ({', '.join('?' for _ in travel_classes)})")
+        params.extend(travel_classes)
+    if max_price is not None:
+        clauses.append("price <= ?")
+        params.append(max_price)
+    return " AND ".join(clauses), params
+
+# Departure dates a fare calendar covers, from its normalised cache arguments
+def calendar_window(arguments):
+    center_date = datetime.strptime(arguments["center_date"], DB_DATE_FORMAT)
+    days = timedelta(days=arguments["days"])
+    return to_db_date(center_date - days), to_db_date(center_date + days)
+
+# Search a route over a date window, returning one page of results together with the
+# cheapest and earliest matching flights and the total count, all from a single query.
+# Results are cached until the flights departing in the window change.
+@timed("search_flights")
+@cached_search(lambda arguments: (arguments["start_date"], arguments["end_date"]))
+def search_flights(conn, origin, destination, start_date, end_date, travel_classes=None, max_price=None,
+                   sort="date", page=1, page_size=5):
+    where, params = search_filter(origin, destination, start_date, end_date, travel_classes, max_price)
+    first = (page - 1) * page_size + 1
+    last = page * page_size
+
+    rows = conn.execute(f'''
+        WITH ranked AS (
+            SELECT {FLIGHT_FIELDS},
+                   COUNT(*) OVER () AS total,
+                   ROW_NUMBER() OVER (ORDER BY {SORT_ORDERS[sort]}) AS sort_rank,
+                   ROW_NUMBER() OVER (ORDER BY {SORT_ORDERS["price"]}) AS price_rank,
+                   ROW_NUMBER() OVER (ORDER BY {SORT_ORDERS["date"]}) AS date_rank
+            FROM flights
+            WHERE {where}
+        )
+        SELECT {FLIGHT_FIELDS}, total, sort_rank, price_rank, date_rank
+        FROM ranked
+        WHERE sort_rank BETWEEN ? AND ? OR price_rank = 1 OR date_rank = 1
+        ORDER BY sort_rank
+    ''', params + [first, last]).fetchall()
+
+    total = rows[0][7] if rows else 0
+    return {
+        "flights": [row[:7] for row in rows if first <= row[8] <= last],
+        "cheapest": next((row[:7] for row in rows if row[9] == 1), None),
+        "earliest": next((row[:7] for row in rows if row[10] == 1), None),
+        "total": total,
+        "page": page,
+        "pages": math.ceil(total / page_size),
+    }
+
+# Lowest fare and number of flights per day and class for the `days` days either side of a date,
+# grouped in one query: {departure_date: {travel_class: (lowest_price, flights)}}
+@timed("fare_calendar")
+@cached_search(calendar_window)
+def fare_calendar(conn, origin, destination, center_date, days=3, travel_classes=None, max_price=None):
+    start_date = center_date - timedelta(days=days)
+    end_date = center_date + timedelta(days=days)
+    where, params = search_filter(origin, destination, start_date, end_date, travel_classes, max_price)
+
+    calendar = {}
+    for departure_date, travel_class, lowest_price, flights in conn.execute(f'''
+        SELECT departure_date, travel_class, MIN(price), COUNT(*)
+        FROM flights
+        WHERE {where}
+        GROUP BY departure_date, travel_class
+        ORDER BY departure_date, travel_class
+    ''', params):
+        calendar.setdefault(departure_date, {})[travel_class] = (lowest_price, flights)
+    return calendar
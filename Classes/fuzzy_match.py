@@ -0,0 +1,114 @@
+import numpy as np
+from collections import defaultdict
+
+# Length of the character n-grams used to find candidate names
+GRAM_SIZE = 2
+
+# Most edits allowed for a query of this length when distances are scaled by length:
+# short strings such as IATA codes would otherwise match a large part of a big gazetteer
+def scaled_distance(length):
+    if length <= 2:
+        return 0
+    if length <= 5:
+        return 1
+    return 2
+
+# Normalise a name for matching: lowercase with single spaces
+def normalise(text):
+    return " ".join(text.lower().split())
+
+# Distinct padded character n-grams of a normalised name
+def name_grams(text):
+    padded = f"{'$' * (GRAM_SIZE - 1)}{text}{'$' * (GRAM_SIZE - 1)}"
+    return {padded[i:i + GRAM_SIZE] for i in range(len(padded) - GRAM_SIZE + 1)}
+
+# Levenshtein distance that gives up as soon as it must exceed `bound`, returning bound + 1.
+# Only cells within `bound` of the diagonal can stay under the bound, so only that band is computed.
+def bounded_edit_distance(a, b, bound):
+    if abs(len(a) - len(b)) > bound:
+        return bound + 1
+    if a == b:
+        return 0
+    over = bound + 1
+    previous = [min(j, over) for j in range(len(b) + 1)]
+    for i, char_a in enumerate(a, 1):
+        low, high = max(1, i - bound), min(len(b), i + bound)
+        current = [over] * (len(b) + 1)
+        current[0] = min(i, over)
+        for j in range(low, high + 1):
+            current[j] = min(previous[j - 1] + (char_a != b[j - 1]), current[j - 1] + 1, previous[j] + 1, over)
+        if min(current[low - 1:high + 1]) > bound:
+            return over
+        previous = current
+    return previous[-1]
+
+# Fuzzy index over location names, IATA codes and aliases.
+# Candidates are found through an n-gram index, using the fact that every edit removes at most
+# GRAM_SIZE n-grams, and only those are checked with the bounded edit distance.
+# With scale_distance set, short queries are allowed fewer edits (see scaled_distance).
+class LocationMatcher:
+    def __init__(self, entries, scale_distance=False):
+        self.scale_distance = scale_distance
+        self.names = []
+        self.locations = []
+        postings = defaultdict(list)
+        self.by_length = defaultdict(list)
+        gram_counts = []
+
+        # entries are (name, location) pairs; several names may point to the same location
+        for name, location in entries:
+            key = normalise(name)
+            if not key:
+                continue
+            entry_id = len(self.names)
+            grams = name_grams(key)
+            self.names.append(key)
+            self.locations.append(location)
+            gram_counts.append(len(grams))
+            self.by_length[len(key)].append(entry_id)
+            for gram in grams:
+                postings[gram].append(entry_id)
+
+        # Store postings as arrays so shared n-grams are counted with vectorised operations
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+        self.gram_counts = np.array(gram_counts, dtype=np.int32)
+        self.lengths = np.array([len(name) for name in self.names], dtype=np.int32)
+
+    # Entries that could be within max_distance of the query
+    def candidates(self, query, max_distance):
+        grams = name_grams(query)
+        max_lost = max_distance * GRAM_SIZE
+
+        # Very short queries share too few n-grams to filter on, so check names of a similar length
+        if len(grams) <= max_lost:
+            return [entry_id for length in range(len(query) - max_distance, len(query) + max_distance + 1)
+                    for entry_id in self.by_length.get(length, ())]
+
+        matched = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not matched:
+            return []
+        entry_ids, shared = np.unique(np.concatenate(matched), return_counts=True)
+        enough_shared = shared >= np.maximum(self.gram_counts[entry_ids], len(grams)) - max_lost
+        close_length = np.abs(self.lengths[entry_ids] - len(query)) <= max_distance
+        return entry_ids[enough_shared & close_length].tolist()
+
+    # Locations within max_distance edits of the query, closest first, then in the order they were added
+    def search(self, query, max_distance=2, limit=5):
+        query = normalise(query)
+        if self.scale_distance:
+            max_distance = min(max_distance, scaled_distance(len(query)))
+        best = {}
+        for entry_id in self.candidates(query, max_distance):
+            distance = bounded_edit_distance(query, self.names[entry_id], max_distance)
+            if distance > max_distance:
+                continue
+            location = self.locations[entry_id]
+            if location not in best or (distance, entry_id) < best[location]:
+                best[location] = (distance, entry_id)
+        ranked = sorted(best.items(), key=lambda item: item[1])
+        return [(location, distance) for location, (distance, _) in ranked[:limit]]
+
+    # The closest location within max_distance, or None
+    def best(self, query, max_distance=2):
+        matches = self.search(query, max_distance, limit=1)
+        return matches[0][0] if matches else None
@@ -1,90 +1,108 @@
-import json, re, nltk
-import pandas as pd
-from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer
+import csv, json, nltk
+from functools import lru_cache
+import sklearn
 from sklearn.metrics.pairwise import cosine_similarity
-from nltk.corpus import wordnet, stopwords
-from nltk import word_tokenize
-from nltk.stem import WordNetLemmatizer
-from sklearn.feature_extraction.text import TfidfVectorizer
+from nltk.corpus import wordnet
+from Classes.preprocessing import preprocess, preprocess_input, build_pos_lexicon, set_pos_lexicon
+from Classes.model_registry import fingerprint, get_artifact, save_artifact, prune_artifacts
+from Classes.metrics import timed, timer
+from Classes.qa_retriever import QARetriever, build_qa_store
 
-nltk.download('wordnet', quiet = True)
-nltk.download('averaged_perceptron_tagger', quiet = True)
-nltk.download('punkt', quiet = True)
-nltk.download('stopwords', quiet = True)
+INTENTS_FILE = 'Resources/intents.json'
+QA_FILE = 'Resources/qa.csv'
 
-# Load the QA dataset
-qa_data = pd.read_csv('Resources/qa.csv')
+# NLTK resources used at runtime, each with the alternative names it has had across NLTK releases
+NLTK_RESOURCES = {
+    'wordnet': ['corpora/wordnet', 'corpora/wordnet.zip'],
+    'averaged_perceptron_tagger': ['taggers/averaged_perceptron_tagger_eng', 'taggers/averaged_perceptron_tagger'],
+    'punkt': ['tokenizers/punkt_tab', 'tokenizers/punkt'],
+    'stopwords': ['corpora/stopwords', 'corpora/stopwords.zip'],
+}
 
-# Initialize stop words
-stop_words = set(stopwords.words('english'))
+# Settings for the compiled intent index; changing any of these produces a new artifact
+INDEX_PARAMS = {
+    "format_version": 4,
+    "intent_ngram_range": (1, 3),
+    "sklearn_version": sklearn.__version__,
+    "nltk_version": nltk.__version__,
+}
 
-# Preprocess questions and answers from the dataset
-def preprocess(text):
-    tokens = word_tokenize(text.lower())
-    filtered_tokens = [word for word in tokens if word.isalnum()]  # Only remove non-alphanumeric characters, keep all words
-    return ' '.join(filtered_tokens)
+# Maximum number of out-of-vocabulary tokens whose synonyms are kept in memory
+SYNONYM_CACHE_SIZE = 4096
 
-qa_data['Processed_Question'] = qa_data['Question'].apply(preprocess)
+# Minimum cosine similarity for a QA answer to be returned
+QA_THRESHOLD = 0.7
 
-# TF-IDF for QA Dataset
-qa_vectorizer = TfidfVectorizer()
-tfidf_matrix = qa_vectorizer.fit_transform(qa_data['Processed_Question'])
+# The compiled intent and QA index, loaded lazily on first use, and the QA retriever over it
+_index = None
+_qa_retriever = None
+
+# Number of synonym lookups answered from the precomputed vocabulary table
+_synonym_table_hits = 0
+
+# Download the NLTK resources; only the offline build command does this
+def download_nltk_data():
+    for resource in NLTK_RESOURCES:
+        nltk.download(resource, quiet = True)
+    nltk.download('averaged_perceptron_tagger_eng', quiet = True)
+    nltk.download('punkt_tab', quiet = True)
+
+# Check that the NLTK resources are installed locally without touching the network
+def check_nltk_data():
+    missing = []
+    for resource, paths in NLTK_RESOURCES.items():
+        for path in paths:
+            try:
+                nltk.data.find(path)
+                break
+            except LookupError:
+                continue
+        else:
+            missing.append(resource)
+    if missing:
+        raise LookupError(f"Missing NLTK data: {', '.join(missing)}. "
+                          "Run 'python -m Classes.model_registry build' to install it.")
+
+# Find the closest row of `matrix` for every row of `queries` in one sparse matrix product
+def best_matches(queries, matrix):
+    similarities = cosine_similarity(queries, matrix)
+    best_idx = similarities.argmax(axis=1)
+    return best_idx, similarities[range(len(best_idx)), best_idx]
+
+# The inverted-index retriever over the QA questions, created once per loaded index
+def get_qa_retriever():
+    global _qa_retriever
+    if _qa_retriever is None:
+        _qa_retriever = QARetriever(get_intent_index()["qa"])
+    return _qa_retriever
+
+# Up to k (answer, similarity) pairs for a question, best first, keeping only those above QA_THRESHOLD
+def find_answers(question, k=3):
+    return find_answers_batch([question], k)[0]
+
+# find_answers() for a list of questions, vectorised together and searched one query vector at a time
+def find_answers_batch(questions, k=3):
+    retriever = get_qa_retriever()
+    if not questions:
+        return []
+    with timer("qa_vectorize"):
+        query_vectors = retriever.query_vectors([preprocess(question) for question in questions])
+    with timer("qa_retrieve"):
+        return [retriever.search_vector(terms, weights, k, QA_THRESHOLD) for terms, weights in query_vectors]
 
 # Function to find the most similar answer based on cosine similarity
+@timed("find_answer")
 def find_answer(question):
-    # Preprocess the user question
-    processed_question = preprocess(question)
-    user_tfidf = qa_vectorizer.transform([processed_question])  # Use the QA vectorizer here
-    
-    # Calculate cosine similarities between the user question and all dataset questions
-    similarities = cosine_similarity(user_tfidf, tfidf_matrix)
-    
-    # Find the index of the most similar question
-    max_similarity_index = similarities.argmax()
-    max_similarity_score = similarities[0, max_similarity_index]
-    
-    # Set a similarity threshold to ensure relevance
-    if max_similarity_score > 0.7:  
-        return qa_data.iloc[max_similarity_index]['Answer']
-    else:
-        return None  # Return None if no relevant answer is found
-
-
-lemmatizer = WordNetLemmatizer()
-
-# Preprocess user input
-def preprocess_input(user_input):
-    # Convert to lowercase
-    user_input = user_input.lower()
-    # Remove punctuation
-    user_input = re.sub(r"['\.,!?]", "", user_input)
-    # Remove newline characters
-    user_input = user_input.replace("\n", " ")
-    # Tokenize input
-    tokens = word_tokenize(user_input)
-    # POS tagging
-    pos_tags = nltk.pos_tag(tokens)
-
-    # Function to convert POS tag to a format that WordNetLemmatizer can understand
-    def get_wordnet_pos(tag):
-        if tag.startswith('J'):
-            return wordnet.ADJ
-        elif tag.startswith('V'):
-            return wordnet.VERB
-        elif tag.startswith('N'):
-            return wordnet.NOUN
-        elif tag.startswith('R'):
-            return wordnet.ADV
-        else:
-            return wordnet.NOUN
+    return find_answer_batch([question])[0]
+
+# Find answers for a list of questions at once, returning None where nothing is similar enough
+def find_answer_batch(questions):
+    return [answers[0][0] if answers else None for answers in find_answers_batch(questions, k=1)]
 
-    # Lemmatize tokens with POS tags
-    tokens = [lemmatizer.lemmatize(token, get_wordnet_pos(tag)) for token, tag in pos_tags]
-    return tokens
 
 # Load intents from JSON file
-def load_intents(json_file='Resources/intents.json'):
-    with open(json_file, 'r') as f:
+def load_intents(json_file=None):
+    with open(json_file or INTENTS_FILE, 'r') as f:
         intents_data = json.load(f)
     intents = intents_data["intents"]
     return intents
@@ -101,17 +119,97 @@ def build_intent_corpus(intents):
             labels.append(intent)
     return corpus, labels
 
-# Load intents and build corpus from the JSON data
-intents = load_intents()
-corpus, labels = build_intent_corpus(intents)
+# Compile the intent and QA index from intents.json and qa.csv
+def compile_intent_index():
+    from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer
+
+    # Load intents and build corpus from the JSON data
+    corpus, labels = build_intent_corpus(load_intents())
+
+    # Initialise vectoriser and transformer with the corpus
+    vectorizer = CountVectorizer(ngram_range=INDEX_PARAMS["intent_ngram_range"])
+    X_counts = vectorizer.fit_transform(corpus)
+
+    # TF-IDF transformation on the feature counts to adjust importance of terms
+    tfidf_transformer = TfidfTransformer()
+    X_tfidf = tfidf_transformer.fit_transform(X_counts)
+
+    # Synonyms of every vocabulary word, restricted to those the vectoriser can actually use
+    analyzer = vectorizer.build_analyzer()
+    synonym_table = {
+        term: filter_synonyms(get_synonyms(term), vectorizer.vocabulary_, analyzer)
+        for term in vectorizer.vocabulary_ if " " not in term
+    }
+
+    # QA dataset, indexed by the TF-IDF terms of each question
+    with open(QA_FILE, newline='', encoding='utf-8') as f:
+        qa_rows = list(csv.DictReader(f))
+    questions = [row['Question'] for row in qa_rows]
+
+    # Most frequent POS of each word in the intent phrases and QA questions, for tagger-free mode
+    pos_lexicon = build_pos_lexicon([phrase for phrases in load_intents().values() for phrase in phrases]
+                                    + questions)
 
-# Initialise vectoriser and transformer with the corpus
-vectorizer = CountVectorizer(ngram_range=(1, 3))
-X_counts = vectorizer.fit_transform(corpus)
+    return {
+        "vectorizer": vectorizer,
+        "tfidf_transformer": tfidf_transformer,
+        "X_tfidf": X_tfidf,
+        "labels": labels,
+        "synonym_table": synonym_table,
+        "qa": build_qa_store([preprocess(question) for question in questions], [row['Answer'] for row in qa_rows]),
+        "pos_lexicon": pos_lexicon,
+    }
 
-# TF-IDF transformation on the feature counts to adjust importance of terms
-tfidf_transformer = TfidfTransformer()
-X_tfidf = tfidf_transformer.fit_transform(X_counts)
+# Key identifying the index compiled from the current intents, QA data and settings
+def intent_index_key():
+    return fingerprint([INTENTS_FILE, QA_FILE], INDEX_PARAMS)
+
+# Compile and save the index as part of the offline build
+def build_intent_index_artifact():
+    check_nltk_data()
+    key = intent_index_key()
+    path = save_artifact("intent_index", key, compile_intent_index())
+    prune_artifacts("intent_index", key)
+    return "intent_index", key, path
+
+# Return the compiled index, memory-mapping it once per process and recompiling only
+# when intents.json or qa.csv have changed since it was last built
+def get_intent_index():
+    global _index
+    if _index is None:
+        check_nltk_data()
+        _index = get_artifact("intent_index", intent_index_key(), compile_intent_index, mmap_mode='r')
+    return _index
+
+# Lemmatise with the compiled POS lexicon instead of running the POS tagger on every turn
+def enable_tagger_free_mode():
+    set_pos_lexicon(get_intent_index()["pos_lexicon"])
+
+# Go back to running the POS tagger on every turn
+def disable_tagger_free_mode():
+    set_pos_lexicon(None)
+
+# Compare tagger-free preprocessing against full POS tagging on every intents.json phrase
+def validate_tagger_free_mode():
+    phrases = [phrase for phrases in load_intents().values() for phrase in phrases]
+    disable_tagger_free_mode()
+    tagged = [preprocess_input(phrase) for phrase in phrases]
+    tagged_intents = match_intent_batch(phrases)
+    enable_tagger_free_mode()
+    try:
+        tagger_free = [preprocess_input(phrase) for phrase in phrases]
+        tagger_free_intents = match_intent_batch(phrases)
+    finally:
+        disable_tagger_free_mode()
+
+    token_pairs = [pair for a, b in zip(tagged, tagger_free) for pair in zip(a, b)]
+    return {
+        "phrases": len(phrases),
+        "lemma_agreement": sum(a == b for a, b in token_pairs) / max(len(token_pairs), 1),
+        "phrase_agreement": sum(a == b for a, b in zip(tagged, tagger_free)) / max(len(phrases), 1),
+        "intent_agreement": sum(a == b for a, b in zip(tagged_intents, tagger_free_intents)) / max(len(phrases), 1),
+        "mismatches": [(phrase, a, b) for phrase, a, b in zip(phrases, tagged, tagger_free) if a != b],
+    }
 
 # Function to get synonyms for a given word
 def get_synonyms(word):
@@ -121,38 +219,79 @@ def get_synonyms(word):
             synonyms.add(lemma.name().replace("_", " "))
     return synonyms
 
-# Expand input with synonyms
+# Keep only the synonyms that produce at least one feature in the intent vocabulary
+def filter_synonyms(synonyms, vocabulary, analyzer):
+    return tuple(sorted(synonym for synonym in synonyms if any(term in vocabulary for term in analyzer(synonym))))
+
+# Synonyms for words outside the intent vocabulary, kept in a bounded LRU cache
+@lru_cache(maxsize=SYNONYM_CACHE_SIZE)
+def unknown_word_synonyms(word):
+    vectorizer = get_intent_index()["vectorizer"]
+    return filter_synonyms(get_synonyms(word), vectorizer.vocabulary_, vectorizer.build_analyzer())
+
+# Synonyms of a word that can affect intent matching
+def cached_synonyms(word):
+    global _synonym_table_hits
+    synonym_table = get_intent_index()["synonym_table"]
+    if word in synonym_table:
+        _synonym_table_hits += 1
+        return synonym_table[word]
+    return unknown_word_synonyms(word)
+
+# Hit and miss counters for the synonym caches
+def synonym_cache_info():
+    lru_info = unknown_word_synonyms.cache_info()
+    return {
+        "table_hits": _synonym_table_hits,
+        "table_size": len(get_intent_index()["synonym_table"]),
+        "lru_hits": lru_info.hits,
+        "lru_misses": lru_info.misses,
+        "lru_size": lru_info.currsize,
+        "lru_maxsize": lru_info.maxsize,
+    }
+
+# Expand input with synonyms, in a fixed order so the n-grams built from it are the same in every process
 def expand_with_synonyms(tokens):
-    expanded_tokens = set(tokens)  # Start with original tokens
+    expanded_tokens = dict.fromkeys(tokens)  # Start with original tokens
     for token in tokens:
-        expanded_tokens.update(get_synonyms(token))  # Add synonyms
+        expanded_tokens.update(dict.fromkeys(cached_synonyms(token)))  # Add synonyms
     return list(expanded_tokens)
 
 # Intent matching function with synonym-based fallback
+@timed("match_intent")
 def match_intent(user_input):
-    # Preprocess and vectorise user input
-    tokens = preprocess_input(user_input)
-    user_input_tfidf = tfidf_transformer.transform(vectorizer.transform([" ".join(tokens)]))
-    
-    # Calculate cosine similarity between the vectorized user input and each intent phrase
-    similarities = cosine_similarity(user_input_tfidf, X_tfidf).flatten()
-    best_match_idx = similarities.argmax()
-    
-    # Apply threshold to determine if a match is confident enough
-    if similarities[best_match_idx] >= 0.5:
-        return labels[best_match_idx]
+    return match_intent_batch([user_input])[0]
+
+# Match a list of utterances at once; only the rows that miss the threshold go through the synonym fallback
+def match_intent_batch(user_inputs):
+    index = get_intent_index()
+    vectorizer, tfidf_transformer = index["vectorizer"], index["tfidf_transformer"]
+    X_tfidf, labels = index["X_tfidf"], index["labels"]
+    if not user_inputs:
+        return []
 
-    # Fallback: try expanding with synonyms if no confident match is found
-    expanded_tokens = expand_with_synonyms(tokens)
-    expanded_user_input = " ".join(expanded_tokens)
-    expanded_user_input_tfidf = tfidf_transformer.transform(vectorizer.transform([expanded_user_input]))
+    # Preprocess and vectorise all user inputs together
+    token_lists = [preprocess_input(user_input) for user_input in user_inputs]
+    with timer("intent_vectorize"):
+        user_input_tfidf = tfidf_transformer.transform(vectorizer.transform([" ".join(tokens) for tokens in token_lists]))
+
+    # Calculate cosine similarity between each vectorized input and each intent phrase
+    with timer("intent_similarity"):
+        best_idx, best_scores = best_matches(user_input_tfidf, X_tfidf)
+
+    # Apply threshold to determine if a match is confident enough
+    results = [labels[idx] if score >= 0.5 else None for idx, score in zip(best_idx, best_scores)]
+    misses = [row for row, result in enumerate(results) if result is None]
+    if not misses:
+        return results
 
-    # Recalculate similarity with expanded input and apply a lower threshold
-    expanded_similarities = cosine_similarity(expanded_user_input_tfidf, X_tfidf).flatten()
-    expanded_best_match_idx = expanded_similarities.argmax()
+    # Fallback: try expanding with synonyms for the inputs without a confident match
+    with timer("synonym_fallback"):
+        expanded_user_inputs = [" ".join(expand_with_synonyms(token_lists[row])) for row in misses]
+        expanded_user_input_tfidf = tfidf_transformer.transform(vectorizer.transform(expanded_user_inputs))
+        expanded_best_idx, expanded_best_scores = best_matches(expanded_user_input_tfidf, X_tfidf)
 
     # Use a lower threshold for synonym-based fallback matching
-    if expanded_similarities[expanded_best_match_idx] >= 0.3:
-        return labels[expanded_best_match_idx]
-    
-    return "unknown"
+    for row, idx, score in zip(misses, expanded_best_idx, expanded_best_scores):
+        results[row] = labels[idx] if score >= 0.3 else "unknown"
+    return results
@@ -0,0 +1,127 @@
+import threading, time
+from Classes.database import get_connection, get_metadata, set_metadata
+
+# Metadata key holding the latest change number of the routes table
+ROUTES_VERSION_KEY = "routes_version"
+
+# Metadata key counting changes to the locations table; triggers on the table keep it up to date
+LOCATIONS_VERSION_KEY = "locations_version"
+
+# Seconds between checks for route changes made by other processes
+REFRESH_INTERVAL = 5.0
+
+# Add or withdraw routes, stamping them with a new change number so catalogs can pick up just the changes.
+# Locations are created as needed. Runs inside the caller's transaction.
+def save_routes(conn, routes, active=True):
+    version = int(get_metadata(ROUTES_VERSION_KEY, 0, conn=conn)) + 1
+    for origin, destination in routes:
+        conn.executemany("INSERT OR IGNORE INTO locations (name) VALUES (?)", [(origin,), (destination,)])
+        conn.execute('''
+            INSERT INTO routes (origin, destination, active, version) VALUES (?, ?, ?, ?)
+            ON CONFLICT(origin, destination) DO UPDATE SET active = excluded.active, version = excluded.version
+        ''', (origin, destination, int(active), version))
+    set_metadata(conn, ROUTES_VERSION_KEY, str(version))
+    return version
+
+# Add locations or update their IATA codes and aliases from (name, iata, aliases) rows, aliases being a list.
+# Runs inside the caller's transaction; the triggers on the table record the change for catalogs.
+def save_locations(conn, rows):
+    conn.executemany('''
+        INSERT INTO locations (name, iata, aliases) VALUES (?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET iata = excluded.iata, aliases = excluded.aliases
+    ''', [(name, iata or None, "|".join(aliases) or None) for name, iata, aliases in rows])
+
+# In-memory, read-through view of the locations and routes tables.
+# It is loaded on first use; afterwards only routes changed since the last load are read back,
+# along with the locations whenever their names, IATA codes or aliases change.
+class LocationCatalog:
+    def __init__(self):
+        # (routes, locations) change numbers of the loaded data; caches built from the catalog compare against it
+        self.version = (0, 0)
+        self.checked_at = None
+        self.positions = {}
+        self.aliases = {}
+        self.routes = set()
+        self._origins = ()
+        self._destinations = ()
+        self._destinations_from = {}
+        self._matchers = {}
+        self.lock = threading.Lock()
+
+    # Pick up route and location changes if either stored change number has moved on
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and self.checked_at is not None and now - self.checked_at < REFRESH_INTERVAL:
+            return
+        with self.lock:
+            self.checked_at = now
+            conn = get_connection()
+            version = (int(get_metadata(ROUTES_VERSION_KEY, 0, conn=conn)),
+                       int(get_metadata(LOCATIONS_VERSION_KEY, 0, conn=conn)))
+            if version != self.version:
+                self._load_changes(conn, version)
+
+    # Reload the locations and apply the routes changed since the catalog's version
+    def _load_changes(self, conn, version):
+        self.positions = {}
+        self.aliases = {}
+        for name, location_id, iata, aliases in conn.execute("SELECT name, id, iata, aliases FROM locations"):
+            self.positions[name] = location_id
+            # Other names for a location: its IATA code and any aliases separated by '|'
+            names = ([iata] if iata else []) + [alias for alias in (aliases or "").split("|") if alias]
+            if names:
+                self.aliases[name] = names
+        changes = conn.execute(
+            "SELECT origin, destination, active FROM routes WHERE version > ?", (self.version[0],)
+        ).fetchall()
+        for origin, destination, active in changes:
+            if active:
+                self.routes.add((origin, destination))
+            else:
+                self.routes.discard((origin, destination))
+        self.version = version
+        self._rebuild()
+
+    # Recompute the cached location lists, in the order the locations were added
+    def _rebuild(self):
+        self._matchers = {}
+        order = lambda name: self.positions.get(name, len(self.positions))
+        self._origins = tuple(sorted({origin for origin, _ in self.routes}, key=order))
+        self._destinations = tuple(sorted({destination for _, destination in self.routes}, key=order))
+        self._destinations_from = {
+            origin: tuple(sorted((d for o, d in self.routes if o == origin), key=order)) for origin in self._origins
+        }
+
+    def origins(self):
+        self.refresh()
+        return self._origins
+
+    def destinations(self):
+        self.refresh()
+        return self._destinations
+
+    # Destinations that can be reached directly from an origin
+    def destinations_from(self, origin):
+        self.refresh()
+        return self._destinations_from.get(origin, ())
+
+    # Fuzzy matcher over the names, IATA codes and aliases of some locations, kept until the catalog changes.
+    # Short names such as IATA codes are allowed fewer edits, so they don't match unrelated locations.
+    def matcher(self, locations):
+        from Classes.fuzzy_match import LocationMatcher
+
+        self.refresh()
+        locations = tuple(locations)
+        matcher = self._matchers.get(locations)
+        if matcher is None:
+            entries = [(name, location) for location in locations
+                       for name in (location, *self.aliases.get(location, ()))]
+            matcher = self._matchers[locations] = LocationMatcher(entries, scale_distance=True)
+        return matcher
+
+    def is_valid_route(self, origin, destination):
+        self.refresh()
+        return (origin, destination) in self.routes
+
+# Catalog shared by everything in this process
+catalog = LocationCatalog()
@@ -0,0 +1,110 @@
+import bisect, json, os, threading, time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, float("inf"))
+
+# Timing is off unless switched on, either here or with CHATBOT_METRICS=1
+_enabled = os.environ.get("CHATBOT_METRICS", "") not in ("", "0")
+
+# Per-stage histograms: stage -> [bucket counts, total seconds, count]
+_stages = {}
+_lock = threading.Lock()
+
+# Shared no-op context returned by timer() while timing is off
+_disabled = nullcontext()
+
+def enable():
+    global _enabled
+    _enabled = True
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def is_enabled():
+    return _enabled
+
+# Record one duration for a stage
+def observe(stage, seconds):
+    with _lock:
+        histogram = _stages.get(stage)
+        if histogram is None:
+            histogram = _stages[stage] = [[0] * len(BUCKETS), 0.0, 0]
+        histogram[0][bisect.bisect_left(BUCKETS, seconds)] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+
+@contextmanager
+def _timed_block(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - started)
+
+# Time a block of code under `stage`; costs one flag check while timing is off
+def timer(stage):
+    return _timed_block(stage) if _enabled else _disabled
+
+# Time every call of a function under `stage`
+def timed(stage):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(stage, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+# Forget everything recorded so far
+def reset():
+    with _lock:
+        _stages.clear()
+
+# Copy of the histograms: {stage: {"buckets": {bound: cumulative count}, "sum": seconds, "count": n}}
+def snapshot():
+    with _lock:
+        stages = {stage: (list(counts), total, count) for stage, (counts, total, count) in _stages.items()}
+    report = {}
+    for stage, (counts, total, count) in sorted(stages.items()):
+        cumulative, running = {}, 0
+        for bound, bucket_count in zip(BUCKETS, counts):
+            running += bucket_count
+            cumulative["+Inf" if bound == float("inf") else repr(bound)] = running
+        report[stage] = {"buckets": cumulative, "sum": total, "count": count}
+    return report
+
+# The histograms in the Prometheus text exposition format
+def prometheus_text():
+    lines = ["# HELP chatbot_stage_seconds Time spent in each stage of a conversation turn.",
+             "# TYPE chatbot_stage_seconds histogram"]
+    for stage, histogram in snapshot().items():
+        for bound, count in histogram["buckets"].items():
+            lines.append(f'chatbot_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+        lines.append(f'chatbot_stage_seconds_sum{{stage="{stage}"}} {histogram["sum"]}')
+        lines.append(f'chatbot_stage_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+    return "\n".join(lines) + "\n"
+
+# Write a JSON snapshot, replacing the file atomically so readers never see a partial one
+def write_json(path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"time": time.time(), "stages": snapshot()}, f)
+    os.replace(tmp_path, path)
+
+# Write a JSON snapshot every `interval` seconds from a background thread
+def start_json_export(path, interval=10.0):
+    def export():
+        while True:
+            time.sleep(interval)
+            write_json(path)
+    thread = threading.Thread(target=export, name="metrics-export", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,78 @@
+import hashlib, json, os, sys
+from joblib import dump, load
+
+# Directory holding trained model artifacts, one file per (name, key) pair
+MODEL_DIR = 'Resources/models'
+
+# Artifacts already loaded by this process, keyed by (name, key)
+_loaded = {}
+
+# Hash the contents of the source files together with the parameters used to build from them
+def fingerprint(paths, params):
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 16), b''):
+                digest.update(chunk)
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+# Location of an artifact on disk
+def artifact_path(name, key):
+    return os.path.join(MODEL_DIR, f"{name}-{key}.joblib")
+
+# Write an artifact to disk, replacing it atomically so readers never see a partial file.
+# Each process writes its own temporary file, so workers building the same artifact at once don't collide.
+def save_artifact(name, key, obj):
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    path = artifact_path(name, key)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    dump(obj, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+# Remove older versions of an artifact once a newer key has been built
+def prune_artifacts(name, keep_key):
+    if not os.path.isdir(MODEL_DIR):
+        return
+    keep = os.path.basename(artifact_path(name, keep_key))
+    for filename in os.listdir(MODEL_DIR):
+        if filename.startswith(f"{name}-") and filename.endswith('.joblib') and filename != keep:
+            os.remove(os.path.join(MODEL_DIR, filename))
+
+# Return an artifact, loading it from disk at most once per process.
+# If no artifact exists for this key yet, it is built once with `builder` and saved.
+# Pass mmap_mode='r' to memory-map the artifact's arrays instead of reading them into memory.
+def get_artifact(name, key, builder, mmap_mode=None):
+    cache_key = (name, key)
+    if cache_key in _loaded:
+        return _loaded[cache_key]
+
+    path = artifact_path(name, key)
+    if not os.path.exists(path):
+        save_artifact(name, key, builder())
+        prune_artifacts(name, key)
+    obj = load(path, mmap_mode=mmap_mode)
+    _loaded[cache_key] = obj
+    return obj
+
+# Build every registered artifact ahead of time so serving processes only ever load them
+def build_all():
+    from Classes.sentiment_analysis import build_sentiment_artifact, build_sentiment_scorer_artifact
+    from Classes.intent_matching import download_nltk_data, build_intent_index_artifact, validate_tagger_free_mode
+
+    download_nltk_data()
+    for build in (build_sentiment_artifact, build_sentiment_scorer_artifact, build_intent_index_artifact):
+        name, key, path = build()
+        print(f"Built {name} ({key}) -> {path}")
+
+    report = validate_tagger_free_mode()
+    print(f"Tagger-free preprocessing on {report['phrases']} intent phrases: "
+          f"{report['lemma_agreement']:.1%} lemmas, {report['phrase_agreement']:.1%} phrases and "
+          f"{report['intent_agreement']:.1%} intents match full POS tagging")
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["build"]:
+        print("Usage: python -m Classes.model_registry build")
+        sys.exit(1)
+    build_all()
@@ -0,0 +1,83 @@
+import re, nltk
+from collections import Counter, defaultdict, namedtuple
+from functools import lru_cache
+from nltk import word_tokenize
+from nltk.corpus import wordnet
+from nltk.stem import WordNetLemmatizer
+from Classes.metrics import timed
+
+# Maximum number of recent turns and (token, POS) pairs kept in memory
+TURN_CACHE_SIZE = 256
+LEMMA_CACHE_SIZE = 16384
+
+# Everything later stages need from one utterance:
+# the raw tokens, their lemmas for intent matching and the text used for QA lookup
+Turn = namedtuple('Turn', ['tokens', 'lemmas', 'qa_text'])
+
+lemmatizer = WordNetLemmatizer()
+
+# Token -> WordNet POS table used instead of the tagger in tagger-free mode
+_pos_lexicon = None
+
+# Function to convert POS tag to a format that WordNetLemmatizer can understand
+def get_wordnet_pos(tag):
+    if tag.startswith('J'):
+        return wordnet.ADJ
+    elif tag.startswith('V'):
+        return wordnet.VERB
+    elif tag.startswith('N'):
+        return wordnet.NOUN
+    elif tag.startswith('R'):
+        return wordnet.ADV
+    else:
+        return wordnet.NOUN
+
+# Tokenise an utterance once: lowercase, strip punctuation and newlines
+def tokenize(text):
+    text = text.lower()
+    text = re.sub(r"['\.,!?]", "", text)
+    text = text.replace("\n", " ")
+    return word_tokenize(text)
+
+# Tag tokens with WordNet POS, using the lexicon instead of the tagger when it is enabled
+def wordnet_pos_tags(tokens):
+    if _pos_lexicon is not None:
+        return [(token, _pos_lexicon.get(token, wordnet.NOUN)) for token in tokens]
+    return [(token, get_wordnet_pos(tag)) for token, tag in nltk.pos_tag(tokens)]
+
+# Lemmatise a token, remembering the result for each (token, POS) pair
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def lemmatize(token, pos):
+    return lemmatizer.lemmatize(token, pos)
+
+# Run the shared preprocessing for one utterance; repeated calls for the same text are free
+@lru_cache(maxsize=TURN_CACHE_SIZE)
+def preprocess_turn(text):
+    tokens = tuple(tokenize(text))
+    lemmas = tuple(lemmatize(token, pos) for token, pos in wordnet_pos_tags(tokens))
+    qa_text = ' '.join(token for token in tokens if token.isalnum())
+    return Turn(tokens, lemmas, qa_text)
+
+# Preprocess text for QA lookup
+def preprocess(text):
+    return preprocess_turn(text).qa_text
+
+# Preprocess user input for intent matching
+@timed("preprocess_input")
+def preprocess_input(user_input):
+    return list(preprocess_turn(user_input).lemmas)
+
+# Build a token -> WordNet POS table from the tagger's most frequent tag for each token
+def build_pos_lexicon(phrases):
+    counts = defaultdict(Counter)
+    for phrase in phrases:
+        tokens = tokenize(phrase)
+        for token, tag in nltk.pos_tag(tokens):
+            counts[token][get_wordnet_pos(tag)] += 1
+    return {token: tag_counts.most_common(1)[0][0] for token, tag_counts in counts.items()}
+
+# Switch between tagger-free mode (pass a lexicon) and full POS tagging (pass None)
+def set_pos_lexicon(lexicon):
+    global _pos_lexicon
+    _pos_lexicon = lexicon
+    preprocess_turn.cache_clear()
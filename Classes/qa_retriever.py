@@ -0,0 +1,125 @@
+import numpy as np
+
+# Queries whose postings cover more than 1/DENSE_FRACTION of the questions are scored densely
+DENSE_FRACTION = 32
+
+# Build the retrieval store for a QA dataset: the fitted TF-IDF vectoriser, the question
+# vectors as per-term postings, and the answers packed into one UTF-8 buffer.
+# Everything except the vectoriser is a plain array, so the store can be memory-mapped.
+def build_qa_store(questions, answers):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    vectorizer = TfidfVectorizer()
+    matrix = vectorizer.fit_transform(questions).tocsc()
+    matrix.sort_indices()
+
+    # Column t of the CSC matrix lists the questions containing term t, in question order
+    ptr, docs, weights = matrix.indptr.astype(np.int64), matrix.indices.astype(np.int32), matrix.data
+    max_weight = np.zeros(len(ptr) - 1)
+    filled = np.diff(ptr) > 0
+    max_weight[filled] = np.maximum.reduceat(weights, ptr[:-1][filled])
+
+    encoded = [answer.encode('utf-8') for answer in answers]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(answer) for answer in encoded], out=offsets[1:])
+    return {
+        "vectorizer": vectorizer,
+        "postings": {"ptr": ptr, "docs": docs, "weights": weights, "max_weight": max_weight},
+        "answers": {"text": np.frombuffer(b"".join(encoded), dtype=np.uint8), "offsets": offsets},
+    }
+
+# Inverted index over the TF-IDF vectors of the QA questions.
+# A lookup only scores the questions sharing a term with the query, and terms too weak
+# to lift a question over the threshold on their own never have their postings scanned.
+class QARetriever:
+    def __init__(self, store):
+        vectorizer = store["vectorizer"]
+        self.analyzer = vectorizer.build_analyzer()
+        self.vocabulary = vectorizer.vocabulary_
+        self.idf = vectorizer.idf_
+        postings = store["postings"]
+        self.ptr, self.docs, self.weights = postings["ptr"], postings["docs"], postings["weights"]
+        self.max_weight = postings["max_weight"]
+        self.answer_text, self.answer_offsets = store["answers"]["text"], store["answers"]["offsets"]
+
+    def __len__(self):
+        return len(self.answer_offsets) - 1
+
+    # The TF-IDF vectors of several queries in one pass, each as (term ids, weights),
+    # L2-normalised like the question vectors
+    def query_vectors(self, texts):
+        rows, terms = [], []
+        for row, text in enumerate(texts):
+            ids = [self.vocabulary[term] for term in self.analyzer(text) if term in self.vocabulary]
+            rows += [row] * len(ids)
+            terms += ids
+
+        # Count each (query, term) pair once, then weight and normalise each query
+        size = len(self.idf)
+        pairs, counts = np.unique(np.array(rows, dtype=np.int64) * size + np.array(terms, dtype=np.int64),
+                                  return_counts=True)
+        rows, terms = np.divmod(pairs, size)
+        weights = counts * self.idf[terms]
+        norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=len(texts)))
+        weights /= norms[rows]
+        bounds = np.searchsorted(rows, np.arange(len(texts) + 1))
+        return [(terms[start:end], weights[start:end]) for start, end in zip(bounds[:-1], bounds[1:])]
+
+    # The TF-IDF vector of one query
+    def query_vector(self, text):
+        return self.query_vectors([text])[0]
+
+    def answer(self, doc):
+        return self.answer_text[self.answer_offsets[doc]:self.answer_offsets[doc + 1]].tobytes().decode('utf-8')
+
+    # Up to k (answer, cosine similarity) pairs scoring above min_score, best first;
+    # ties go to the earlier question, as with an argmax over every question
+    def search(self, text, k=1, min_score=0.0):
+        return self.search_vector(*self.query_vector(text), k, min_score)
+
+    # search() for several queries, vectorised together
+    def search_batch(self, texts, k=1, min_score=0.0):
+        return [self.search_vector(terms, weights, k, min_score) for terms, weights in self.query_vectors(texts)]
+
+    # search() for a query already turned into (term ids, weights) by query_vectors()
+    def search_vector(self, terms, weights, k=1, min_score=0.0):
+        if not len(terms):
+            return []
+
+        # A question found only in the postings of the weakest terms scores at most the sum of
+        # their best weights, so while that sum stays within min_score those terms add no candidates
+        bounds = weights * self.max_weight[terms]
+        order = np.argsort(bounds, kind='stable')
+        reachable = np.cumsum(bounds[order]) > min_score
+        if not reachable.any():
+            return []
+        essential, optional = order[reachable], order[~reachable]
+
+        postings = self.postings(terms[essential], weights[essential])
+        if len(postings[0]) * DENSE_FRACTION > len(self):
+            # Long postings: summing every term into one slot per question is cheaper than sorting them
+            docs, contributions = self.postings(terms, weights)
+            totals = np.bincount(docs, weights=contributions, minlength=len(self))
+            candidates = np.flatnonzero(totals > min_score)
+            scores = totals[candidates]
+        else:
+            candidates, inverse = np.unique(postings[0], return_inverse=True)
+            scores = np.bincount(inverse, weights=postings[1], minlength=len(candidates))
+
+            # The weak terms only add to questions that are already candidates
+            for term, weight in zip(terms[optional], weights[optional]):
+                docs = self.docs[self.ptr[term]:self.ptr[term + 1]]
+                found = np.searchsorted(docs, candidates)
+                found[found == len(docs)] = 0
+                present = docs[found] == candidates
+                scores[present] += self.weights[self.ptr[term] + found[present]] * weight
+
+        passing = np.flatnonzero(scores > min_score)
+        best = passing[np.lexsort((candidates[passing], -scores[passing]))[:k]]
+        return [(self.answer(candidates[row]), float(scores[row])) for row in best]
+
+    # The postings of some query terms joined into (question ids, weighted contributions)
+    def postings(self, terms, weights):
+        slices = [slice(self.ptr[term], self.ptr[term + 1]) for term in terms]
+        return (np.concatenate([self.docs[s] for s in slices]),
+                np.concatenate([self.weights[s] * weight for s, weight in zip(slices, weights)]))
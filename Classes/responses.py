@@ -56,6 +56,10 @@ responses = {
         "Could you share your destination? Here’s what we have: {available_destinations}.",
         "Please let me know your destination from these options: {available_destinations}."
     ],
+    "route_unavailable": [
+        "Sorry, we don't fly from {origin} to {destination}. From {origin} you can fly to: {available_destinations}.",
+        "There are no flights from {origin} to {destination}. Please pick one of: {available_destinations}."
+    ],
     "departure_date_prompt": [
         "When would you like to depart? (Format: DD-MM-YYYY or words like 'tomorrow')",
         "What is your desired departure date? You can also mention terms like 'next week'.",
@@ -76,6 +80,10 @@ responses = {
         "All set! Your flight has been booked.",
         "Booking complete. Wishing you a great journey!"
     ],
+    "flight_sold_out": [
+        "Sorry, the last seat on that flight has just been taken. Please try another flight.",
+        "Unfortunately that flight is now fully booked. Let me know if you'd like to search again."
+    ],
     "booking_confirmed_details": [
         "Your flight {flight_number} from {origin} to {destination} on {departure_date} in {travel_class} class is booked!",
         "You're all set! Flight {flight_number} from {origin} to {destination} has been booked for {departure_date} in {travel_class} class.",
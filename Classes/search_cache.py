@@ -0,0 +1,226 @@
+import inspect, os, pickle, sqlite3, threading, time
+from collections import Counter, OrderedDict
+from datetime import date
+from functools import wraps
+from Classes.date_parser import to_db_date
+
+# Shared store used by every process on this machine
+CACHE_DB_PATH = 'Resources/search_cache.db'
+
+# Earliest and latest possible dates, for invalidating open-ended ranges
+MIN_DB_DATE = '0000-01-01'
+MAX_DB_DATE = '9999-12-31'
+
+# Returned by SearchCache.get when a key isn't cached
+MISSING = object()
+
+# Bounded TTL/LRU cache of flight search results.
+# Each process keeps recent results in memory and shares them with other processes through a
+# small SQLite store. Entries remember the departure dates they cover so that a reseed or a
+# booking only drops the results it can have changed. Invalidations are logged in the shared
+# store, and every process applies new ones to its in-memory entries before each lookup.
+class SearchCache:
+    def __init__(self, maxsize=1024, ttl=60.0, store_path=CACHE_DB_PATH):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.store_path = store_path
+        self.enabled = True
+        self.entries = OrderedDict()
+        self.stats = Counter()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.seen_invalidation = None
+
+    # This thread's connection to the shared store
+    def _store(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = sqlite3.connect(self.store_path, timeout=5)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            with conn:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS search_cache (
+                        key TEXT PRIMARY KEY,
+                        date_from TEXT NOT NULL,
+                        date_to TEXT NOT NULL,
+                        expires_at REAL NOT NULL,
+                        value BLOB NOT NULL
+                    )
+                ''')
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_search_cache_dates ON search_cache (date_from, date_to)")
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS invalidations (
+                        id INTEGER PRIMARY KEY,
+                        date_from TEXT NOT NULL,
+                        date_to TEXT NOT NULL,
+                        created_at REAL NOT NULL
+                    )
+                ''')
+        return conn
+
+    # Called in forked children, which must open their own store connections
+    def forget_connections(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    # Drop in-memory entries overlapping a date range
+    def _drop_local(self, date_from, date_to):
+        stale = [key for key, (_, entry_from, entry_to, _) in self.entries.items()
+                 if entry_from <= date_to and entry_to >= date_from]
+        for key in stale:
+            del self.entries[key]
+        self.stats["invalidated"] += len(stale)
+
+    # Apply invalidations made by other processes since the last lookup.
+    # data_version only moves when another connection commits, so most lookups skip the query.
+    def _sync_invalidations(self, store):
+        data_version = store.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == getattr(self.local, "data_version", None):
+            return
+        self.local.data_version = data_version
+        if self.seen_invalidation is None:
+            self.seen_invalidation = store.execute("SELECT COALESCE(MAX(id), 0) FROM invalidations").fetchone()[0]
+            return
+        rows = store.execute("SELECT id, date_from, date_to FROM invalidations WHERE id > ? ORDER BY id",
+                             (self.seen_invalidation,)).fetchall()
+        for invalidation_id, date_from, date_to in rows:
+            self._drop_local(date_from, date_to)
+            self.seen_invalidation = invalidation_id
+
+    # Add an entry to memory, evicting the least recently used one when full
+    def _put_local(self, key, expires_at, date_from, date_to, value):
+        self.entries[key] = (expires_at, date_from, date_to, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    # Cached value for a key, or MISSING
+    def get(self, key):
+        now = time.time()
+        store = self._store()
+        with self.lock:
+            self._sync_invalidations(store)
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.entries.move_to_end(key)
+                self.stats["local_hits"] += 1
+                return entry[3]
+            if entry is not None:
+                del self.entries[key]
+
+        row = store.execute("SELECT expires_at, date_from, date_to, value FROM search_cache WHERE key = ? AND expires_at > ?",
+                            (key, now)).fetchone()
+        with self.lock:
+            if row is None:
+                self.stats["misses"] += 1
+                return MISSING
+            value = pickle.loads(row[3])
+            self._put_local(key, row[0], row[1], row[2], value)
+            self.stats["shared_hits"] += 1
+            return value
+
+    # Id of the latest invalidation in any process. Take it before computing a value and pass it to put(),
+    # so a value that an invalidation may have made stale in the meantime is never cached.
+    def generation(self):
+        return self._store().execute("SELECT COALESCE(MAX(id), 0) FROM invalidations").fetchone()[0]
+
+    # Cache a value covering departures from date_from to date_to (ISO dates), unless an invalidation of those
+    # dates has been logged since `generation`. The check and the insert are one statement, so another process
+    # can't invalidate in between; checking again under the lock covers invalidations made by this process.
+    def put(self, key, value, date_from, date_to, generation=None):
+        expires_at = time.time() + self.ttl
+        store = self._store()
+        fresh = "? IS NULL OR NOT EXISTS (SELECT 1 FROM invalidations WHERE id > ? AND date_from <= ? AND date_to >= ?)"
+        freshness = (generation, generation, date_to, date_from)
+        with store:
+            saved = store.execute(f'''
+                INSERT OR REPLACE INTO search_cache (key, date_from, date_to, expires_at, value)
+                SELECT ?, ?, ?, ?, ? WHERE {fresh}
+            ''', (key, date_from, date_to, expires_at, pickle.dumps(value)) + freshness).rowcount
+        with self.lock:
+            if saved and store.execute(f"SELECT {fresh}", freshness).fetchone()[0]:
+                self._put_local(key, expires_at, date_from, date_to, value)
+            else:
+                self.stats["stale_skipped"] += 1
+
+    # Drop every cached result, in all processes, that covers departures in a date range
+    def invalidate(self, date_from, date_to):
+        now = time.time()
+        store = self._store()
+        with store:
+            store.execute("DELETE FROM search_cache WHERE date_from <= ? AND date_to >= ?", (date_to, date_from))
+            store.execute("DELETE FROM search_cache WHERE expires_at <= ?", (now,))
+            store.execute("INSERT INTO invalidations (date_from, date_to, created_at) VALUES (?, ?, ?)",
+                          (date_from, date_to, now))
+            # Entries never outlive the TTL, so older invalidations can no longer matter
+            store.execute("DELETE FROM invalidations WHERE created_at < ?", (now - 2 * self.ttl,))
+        with self.lock:
+            self._sync_invalidations(store)
+            self._drop_local(date_from, date_to)
+
+    # Empty the cache in memory and in the shared store
+    def clear(self):
+        self.invalidate(MIN_DB_DATE, MAX_DB_DATE)
+
+    # Hit-rate metrics for this process
+    def info(self):
+        with self.lock:
+            hits = self.stats["local_hits"] + self.stats["shared_hits"]
+            lookups = hits + self.stats["misses"]
+            return {
+                "hits": hits,
+                "local_hits": self.stats["local_hits"],
+                "shared_hits": self.stats["shared_hits"],
+                "misses": self.stats["misses"],
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "evictions": self.stats["evictions"],
+                "invalidated": self.stats["invalidated"],
+                "stale_skipped": self.stats["stale_skipped"],
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+            }
+
+# Cache shared by every search in this process
+search_cache = SearchCache()
+os.register_at_fork(after_in_child=search_cache.forget_connections)
+
+# Normalise a query argument so equivalent searches share a key
+def normalise_argument(value):
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if isinstance(value, date):
+        return to_db_date(value)
+    if isinstance(value, (list, tuple, set)):
+        return tuple(sorted(normalise_argument(item) for item in value))
+    return value
+
+# Cache a search function taking a connection as its first argument.
+# `date_range` maps the normalised arguments to the (from, to) departure dates the result depends on.
+def cached_search(date_range):
+    def decorator(func):
+        # Resolve arguments by hand; inspect's bind() costs more than a cache hit
+        parameters = list(inspect.signature(func).parameters.values())[1:]
+        names = [parameter.name for parameter in parameters]
+        defaults = {parameter.name: parameter.default for parameter in parameters
+                    if parameter.default is not inspect.Parameter.empty}
+
+        @wraps(func)
+        def wrapper(conn, *args, **kwargs):
+            if not search_cache.enabled:
+                return func(conn, *args, **kwargs)
+            arguments = dict(defaults)
+            arguments.update(zip(names, args))
+            arguments.update(kwargs)
+            arguments = {name: normalise_argument(arguments[name]) for name in names}
+            key = repr((func.__name__, tuple(arguments.values())))
+
+            result = search_cache.get(key)
+            if result is MISSING:
+                generation = search_cache.generation()
+                result = func(conn, *args, **kwargs)
+                search_cache.put(key, result, *date_range(arguments), generation)
+            return result
+        return wrapper
+    return decorator
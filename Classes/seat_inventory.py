@@ -0,0 +1,92 @@
+import time
+from Classes.database import QUERIES
+from Classes.search_cache import search_cache
+
+# Seats sold per flight in each travel class
+SEAT_CAPACITY = {"economy": 150, "business": 30, "first": 8}
+DEFAULT_SEATS = 150
+
+# Seconds a seat stays held for a user deciding whether to book it
+HOLD_SECONDS = 300
+
+def seat_capacity(travel_class):
+    return SEAT_CAPACITY.get(travel_class, DEFAULT_SEATS)
+
+# Add the starting seat count to flight rows (FLIGHT_COLUMNS order) for loading
+def with_seats(rows):
+    for row in rows:
+        yield (*row, seat_capacity(row[5]))
+
+# Columns identifying a seat in the flights table, from a search result row
+def flight_key(flight):
+    flight_number, origin, destination, departure_date, _, travel_class, _ = flight
+    return origin, destination, departure_date, travel_class, flight_number
+
+# Searches only return flights with seats left, so cached results only go stale when a flight
+# sells out or gets its first seat back. `taken` and `returned` hold (departure_date, seats_left) pairs.
+def seats_changed(taken, returned):
+    dates = {date for date, seats_left in taken if seats_left == 0}
+    dates.update(date for date, seats_left in returned if seats_left == 1)
+    for departure_date in sorted(dates):
+        search_cache.invalidate(departure_date, departure_date)
+
+# Return the seats of expired holds, as part of the caller's transaction
+def expire_holds(conn, now):
+    returned = []
+    for (flight_id,) in conn.execute(QUERIES["expire_holds"], (now,)).fetchall():
+        returned.extend(conn.execute(QUERIES["return_held_seat"], (flight_id,)).fetchall())
+    return returned
+
+# Take one seat with a single conditional update; returns (flight_id, departure_date, seats_left) or None
+def take_seat(conn, key):
+    rows = conn.execute(QUERIES["take_seat"], key).fetchall()
+    return rows[0] if rows else None
+
+# Hold a seat on a flight for `seconds`, returning the hold id, or None if the flight is full
+def reserve_seat(conn, flight, name, seconds=HOLD_SECONDS):
+    now = time.time()
+    hold_id = None
+    taken = []
+    with conn:
+        returned = expire_holds(conn, now)
+        seat = take_seat(conn, flight_key(flight))
+        if seat:
+            hold_id = conn.execute(QUERIES["insert_hold"], (seat[0], name, now + seconds)).lastrowid
+            taken.append(seat[1:])
+    seats_changed(taken, returned)
+    return hold_id
+
+# Give a held seat back
+def release_hold(conn, hold_id):
+    with conn:
+        held = conn.execute(QUERIES["release_hold"], (hold_id,)).fetchall()
+        returned = conn.execute(QUERIES["return_held_seat"], held[0]).fetchall() if held else []
+    seats_changed([], returned)
+
+# Book a seat and record the booking in one transaction.
+# A hold that hasn't expired becomes the booking; otherwise a free seat is taken if there is one.
+# Returns False, without booking, when the flight is full.
+def book_seat(conn, key, booking, hold_id=None):
+    now = time.time()
+    taken = []
+    with conn:
+        returned = expire_holds(conn, now)
+        booked = hold_id is not None and bool(conn.execute(QUERIES["take_hold"], (hold_id, now)).fetchall())
+        if not booked:
+            seat = take_seat(conn, key)
+            if seat:
+                taken.append(seat[1:])
+                booked = True
+        if booked:
+            conn.execute(QUERIES["add_user"], (booking[0],))
+            conn.execute(QUERIES["insert_booking"], booking)
+    seats_changed(taken, returned)
+    return booked
+
+# Cancel one of a user's bookings and give its seat back; returns False if they have no such booking
+def cancel_seat(conn, name, booking_id):
+    with conn:
+        cancelled = conn.execute(QUERIES["cancel_booking"], (booking_id, name)).fetchall()
+        returned = conn.execute(QUERIES["return_seat"], cancelled[0]).fetchall() if cancelled else []
+    seats_changed([], returned)
+    return bool(cancelled)
@@ -1,39 +1,127 @@
-import pandas as pd
-from joblib import dump, load
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
-from sklearn.pipeline import Pipeline
-from sklearn.model_selection import cross_val_score
+import csv
+from importlib.metadata import version
 from Classes.responses import get_response
+from Classes.model_registry import fingerprint, get_artifact, save_artifact, prune_artifacts
+from Classes.metrics import timed, timer
+from Classes.sentiment_scorer import SentimentScorer, compile_sentiment_scorer, verify_scorer
 
-# Load the new training dataset
-data = pd.read_csv('Resources/large_sentiment_training_dataset.csv')
-responses = data["Response"].values
-sentiments = data["Sentiment"].values
+SENTIMENT_DATASET = 'Resources/large_sentiment_training_dataset.csv'
 
-# Define the pipeline
-pipeline = Pipeline([
-    ('vectorizer', TfidfVectorizer(max_features=3000, sublinear_tf=True, use_idf=True, ngram_range=(1, 2))),
-    ('classifier', LogisticRegression(C=1.0, max_iter=200))  
-])
+# Hyperparameters for the sentiment pipeline; changing any of these produces a new artifact
+SENTIMENT_PARAMS = {
+    "vectorizer": {"max_features": 3000, "sublinear_tf": True, "use_idf": True, "ngram_range": (1, 2)},
+    "classifier": {"C": 1.0, "max_iter": 200},
+    "sklearn_version": version("scikit-learn"),
+}
 
-# Cross-validation for evaluation
-scores = cross_val_score(pipeline, responses, sentiments, cv=5)
+# Largest difference in class probability allowed between the compiled scorer and the pipeline
+SCORER_TOLERANCE = 1e-9
 
-# Train the model
-pipeline.fit(responses, sentiments)
+# The trained pipeline and the compiled scorer used for serving, each loaded lazily on first use
+_pipeline = None
+_scorer = None
 
-# Save the model for reuse
-dump(pipeline, 'sentiment_pipeline.joblib')
+# Key identifying the artifact built from the current dataset and hyperparameters
+def sentiment_model_key():
+    return fingerprint([SENTIMENT_DATASET], SENTIMENT_PARAMS)
 
-# Print a different output based on the classified sentiment
-def classify_sentiment(user_input, name):
-    pipeline = load('sentiment_pipeline.joblib')
-    sentiment = pipeline.predict([user_input])[0]
+# Utterances and their labelled sentiments from the training dataset
+def load_sentiment_dataset():
+    with open(SENTIMENT_DATASET, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    return [row["Response"] for row in rows], [row["Sentiment"] for row in rows]
+
+# Train the sentiment pipeline on the training dataset
+def train_sentiment_pipeline(evaluate=False):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import Pipeline
+    from sklearn.model_selection import cross_val_score
+
+    # Load the training dataset
+    responses, sentiments = load_sentiment_dataset()
+
+    # Define the pipeline
+    pipeline = Pipeline([
+        ('vectorizer', TfidfVectorizer(**SENTIMENT_PARAMS["vectorizer"])),
+        ('classifier', LogisticRegression(**SENTIMENT_PARAMS["classifier"]))
+    ])
+
+    # Cross-validation for evaluation
+    if evaluate:
+        scores = cross_val_score(pipeline, responses, sentiments, cv=5)
+        print(f"Sentiment cross-validation accuracy: {scores.mean():.3f} (+/- {scores.std():.3f})")
+
+    # Train the model
+    pipeline.fit(responses, sentiments)
+    return pipeline
+
+# Train, evaluate and save the pipeline as part of the offline build
+def build_sentiment_artifact():
+    key = sentiment_model_key()
+    path = save_artifact("sentiment_pipeline", key, train_sentiment_pipeline(evaluate=True))
+    prune_artifacts("sentiment_pipeline", key)
+    return "sentiment_pipeline", key, path
+
+# Return the trained pipeline, loading it once per process; serving uses the compiled scorer instead
+def get_sentiment_pipeline():
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = get_artifact("sentiment_pipeline", sentiment_model_key(), train_sentiment_pipeline)
+    return _pipeline
+
+# Compile the trained pipeline into a scorer, refusing to if it predicts any
+# training utterance differently from the pipeline
+def compile_verified_scorer():
+    pipeline = get_sentiment_pipeline()
+    store = compile_sentiment_scorer(pipeline)
+    report = verify_scorer(SentimentScorer(store), pipeline, load_sentiment_dataset()[0])
+    if report["label_mismatches"] or report["max_probability_error"] > SCORER_TOLERANCE:
+        raise ValueError(f"Compiled sentiment scorer disagrees with the pipeline: {report}")
+    return store
+
+# Compile, verify and save the scorer as part of the offline build
+def build_sentiment_scorer_artifact():
+    key = sentiment_model_key()
+    path = save_artifact("sentiment_scorer", key, compile_verified_scorer())
+    prune_artifacts("sentiment_scorer", key)
+    return "sentiment_scorer", key, path
+
+# Return the compiled scorer, loading it once per process without importing scikit-learn
+def get_sentiment_scorer():
+    global _scorer
+    if _scorer is None:
+        _scorer = SentimentScorer(get_artifact("sentiment_scorer", sentiment_model_key(), compile_verified_scorer,
+                                               mmap_mode='r'))
+    return _scorer
+
+# Probability of each class for a list of utterances, with columns in the order of sentiment_classes()
+def sentiment_probabilities(texts):
+    return get_sentiment_scorer().predict_proba(texts)
+
+def sentiment_classes():
+    return get_sentiment_scorer().classes
+
+# Classify a list of utterances at once as "positive", "negative" or "neutral"
+def classify_sentiment_batch(texts):
+    if not texts:
+        return []
+    return get_sentiment_scorer().predict(texts)
+
+# Choose a different response based on the classified sentiment
+@timed("sentiment_response")
+def sentiment_response(user_input, name):
+    scorer = get_sentiment_scorer()
+    with timer("sentiment_inference"):
+        sentiment = scorer.predict([user_input])[0]
     if sentiment == "positive":
-        print(get_response("positive_feelings", name=name))
+        return get_response("positive_feelings", name=name)
     elif sentiment == "negative":
-        print(get_response("negative_feelings", name=name))
+        return get_response("negative_feelings", name=name)
     else:
-        print(get_response("neutral_feelings", name=name))
+        return get_response("neutral_feelings", name=name)
 
+# Print a different output based on the classified sentiment
+@timed("classify_sentiment")
+def classify_sentiment(user_input, name):
+    print(sentiment_response(user_input, name))
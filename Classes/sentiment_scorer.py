@@ -0,0 +1,101 @@
+import re
+import numpy as np
+
+# Export a trained TfidfVectorizer + LogisticRegression pipeline as plain arrays:
+# the vocabulary, IDF weights and one coefficient column per class.
+# Only the settings the scorer reproduces are supported; anything else is rejected here rather
+# than scoring differently at serving time.
+def compile_sentiment_scorer(pipeline):
+    vectorizer, classifier = pipeline.named_steps["vectorizer"], pipeline.named_steps["classifier"]
+    settings = vectorizer.get_params()
+    supported = {"analyzer": "word", "lowercase": True, "preprocessor": None, "tokenizer": None,
+                 "stop_words": None, "strip_accents": None, "norm": "l2", "binary": False}
+    unsupported = [name for name, value in supported.items() if settings[name] != value]
+    if unsupported:
+        raise ValueError(f"Cannot compile a vectorizer with custom {', '.join(unsupported)}")
+
+    # A binary classifier has one coefficient row scoring the second class against the first;
+    # padding it with a zero row for the first class makes the softmax give the same probabilities
+    coef, intercept = classifier.coef_, classifier.intercept_
+    one_vs_rest = len(classifier.classes_) > 2 and (classifier.solver == "liblinear"
+                                                    or getattr(classifier, "multi_class", "auto") == "ovr")
+    if len(classifier.classes_) == 2:
+        coef, intercept = np.vstack([np.zeros_like(coef), coef]), np.concatenate([[0.0], intercept])
+    return {
+        "vocabulary": {term: int(index) for term, index in vectorizer.vocabulary_.items()},
+        "idf": vectorizer.idf_ if settings["use_idf"] else np.ones(len(vectorizer.vocabulary_)),
+        "coef": np.ascontiguousarray(coef.T),
+        "intercept": intercept,
+        "classes": [str(label) for label in classifier.classes_],
+        "token_pattern": settings["token_pattern"],
+        "ngram_range": settings["ngram_range"],
+        "sublinear_tf": settings["sublinear_tf"],
+        "one_vs_rest": one_vs_rest,
+    }
+
+# Scores utterances with the exported TF-IDF weights and logistic regression coefficients.
+# Each utterance is a handful of (term, weight) pairs, so a batch is scored as one sparse dot product.
+class SentimentScorer:
+    def __init__(self, store):
+        self.vocabulary = store["vocabulary"]
+        self.idf, self.coef, self.intercept = store["idf"], store["coef"], store["intercept"]
+        self.classes = store["classes"]
+        self.token_pattern = re.compile(store["token_pattern"])
+        self.ngram_range = store["ngram_range"]
+        self.sublinear_tf = store["sublinear_tf"]
+        self.one_vs_rest = store["one_vs_rest"]
+
+    # Word n-grams in the same order and form as the vectoriser's analyzer
+    def ngrams(self, text):
+        tokens = self.token_pattern.findall(text.lower())
+        low, high = self.ngram_range
+        return [" ".join(tokens[start:start + n]) for n in range(low, high + 1) for start in range(len(tokens) - n + 1)]
+
+    # L2-normalised TF-IDF weights of every utterance as parallel (rows, term ids, weights) arrays
+    def vectorize(self, texts):
+        rows, terms = [], []
+        for row, text in enumerate(texts):
+            ids = [self.vocabulary[gram] for gram in self.ngrams(text) if gram in self.vocabulary]
+            rows += [row] * len(ids)
+            terms += ids
+
+        # Count each (row, term) pair once, then weight and normalise each row
+        size = len(self.idf)
+        pairs, counts = np.unique(np.array(rows, dtype=np.int64) * size + np.array(terms, dtype=np.int64),
+                                  return_counts=True)
+        rows, terms = np.divmod(pairs, size)
+        weights = counts.astype(float)
+        if self.sublinear_tf:
+            weights = np.log(weights) + 1
+        weights *= self.idf[terms]
+        weights /= np.sqrt(np.bincount(rows, weights=weights * weights, minlength=len(texts)))[rows]
+        return rows, terms, weights
+
+    # Raw class scores, one row per utterance
+    def decision_function(self, texts):
+        rows, terms, weights = self.vectorize(texts)
+        contributions = self.coef[terms] * weights[:, None]
+        scores = np.tile(self.intercept, (len(texts), 1))
+        for column in range(scores.shape[1]):
+            scores[:, column] += np.bincount(rows, weights=contributions[:, column], minlength=len(texts))
+        return scores
+
+    # Class probabilities, one row per utterance with columns in the order of self.classes
+    def predict_proba(self, texts):
+        scores = self.decision_function(texts)
+        if self.one_vs_rest:
+            probabilities = 1 / (1 + np.exp(-scores))
+        else:
+            scores -= scores.max(axis=1, keepdims=True)
+            probabilities = np.exp(scores)
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+    def predict(self, texts):
+        return [self.classes[index] for index in self.decision_function(texts).argmax(axis=1)]
+
+# Compare the scorer with the pipeline it was compiled from on a list of utterances
+def verify_scorer(scorer, pipeline, texts):
+    texts = list(texts)
+    label_mismatches = sum(a != b for a, b in zip(scorer.predict(texts), pipeline.predict(texts)))
+    probability_error = np.abs(scorer.predict_proba(texts) - pipeline.predict_proba(texts)).max() if texts else 0.0
+    return {"texts": len(texts), "label_mismatches": label_mismatches, "max_probability_error": float(probability_error)}
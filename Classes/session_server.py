@@ -0,0 +1,222 @@
+import argparse, asyncio, json, multiprocessing, socket, sys, time
+from concurrent.futures import ThreadPoolExecutor
+from Classes import metrics
+from Classes.conversation import conversation
+from Classes.database_setup import setup_database, SEED_MODES
+from Classes.dialogue import Session
+from Classes.intent_matching import get_intent_index, enable_tagger_free_mode
+from Classes.sentiment_analysis import get_sentiment_scorer
+from Classes.startup import preload_for_workers
+
+# Seconds a session may sit idle before it is closed, and at most how often idle sessions are looked for
+SESSION_TTL = 1800
+SWEEP_INTERVAL = 60
+
+# Serves many concurrent conversations from one process.
+# Every session shares the models loaded in this process; each incoming message advances
+# its session's flow on a worker thread so NLP and database work never blocks the event loop.
+class SessionEngine:
+    def __init__(self, workers=4, session_ttl=SESSION_TTL):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.session_ttl = session_ttl
+        self.sessions = {}
+        self.locks = {}
+        self.last_active = {}
+
+    # Load the shared models before accepting messages
+    async def warm_up(self, tagger_free=False):
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            loop.run_in_executor(self.executor, get_intent_index),
+            loop.run_in_executor(self.executor, get_sentiment_scorer),
+        )
+        if tagger_free:
+            enable_tagger_free_mode()
+
+    # Advance one session with an incoming message (None just opens the session)
+    async def handle(self, session_id, message=None):
+        loop = asyncio.get_running_loop()
+        lock = self.locks.setdefault(session_id, asyncio.Lock())
+
+        # Messages for the same session are processed strictly in order
+        async with lock:
+            replies = []
+            session = self.sessions.get(session_id)
+            try:
+                if session is None:
+                    session = self.sessions[session_id] = Session(conversation())
+                    replies += await loop.run_in_executor(self.executor, session.start)
+                if message is not None and not session.finished:
+                    replies += await loop.run_in_executor(self.executor, session.send, message)
+            except Exception:
+                # A failing flow ends only its own session
+                self.drop(session_id)
+                raise
+
+            if session.finished:
+                self.drop(session_id)
+            else:
+                self.last_active[session_id] = time.monotonic()
+            return {"session": session_id, "replies": replies, "done": session.finished}
+
+    # Forget a session and its lock and activity time
+    def drop(self, session_id):
+        self.sessions.pop(session_id, None)
+        self.locks.pop(session_id, None)
+        self.last_active.pop(session_id, None)
+
+    # Close and forget the sessions nobody has sent a message to for session_ttl seconds,
+    # such as those whose client disconnected mid-conversation. Returns how many were closed.
+    def expire_idle_sessions(self, now=None):
+        cutoff = (now if now is not None else time.monotonic()) - self.session_ttl
+        idle = [session_id for session_id, active in self.last_active.items()
+                if active < cutoff and not self.locks[session_id].locked()]
+        for session_id in idle:
+            session = self.sessions[session_id]
+            self.drop(session_id)
+            session.close()
+        return len(idle)
+
+    # Expire idle sessions periodically until cancelled
+    async def sweep_idle_sessions(self):
+        while True:
+            await asyncio.sleep(min(SWEEP_INTERVAL, self.session_ttl))
+            self.expire_idle_sessions()
+
+    # Handle one JSON request line: {"session": "<id>", "message": "<text>"},
+    # or {"metrics": true} for the stage timings in Prometheus text format
+    async def handle_line(self, line):
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                return {"error": "Invalid request: expected a JSON object"}
+            if request.get("metrics"):
+                return {"metrics": metrics.prometheus_text()}
+            session = str(request["session"])
+        except (ValueError, KeyError) as error:
+            return {"error": f"Invalid request: {error}"}
+        message = request.get("message")
+        if message is not None and not isinstance(message, str):
+            return {"session": session, "error": "Invalid request: message must be a string or null"}
+        try:
+            return await self.handle(session, message)
+        except Exception as error:
+            return {"session": session, "error": f"Session ended: {error}", "done": True}
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+# Serve JSON lines read from stdin, writing one JSON response line per request to stdout
+async def serve_stdio(engine):
+    loop = asyncio.get_running_loop()
+    pending = set()
+
+    async def respond(line):
+        print(json.dumps(await engine.handle_line(line)), flush=True)
+
+    while True:
+        line = await loop.run_in_executor(None, sys.stdin.readline)
+        if not line:
+            break
+        if line.strip():
+            task = asyncio.create_task(respond(line))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+    if pending:
+        await asyncio.gather(*pending)
+
+# Serve JSON lines over TCP, one request and one response per line.
+# Pass an already listening socket to share it between worker processes.
+async def serve_tcp(engine, host, port, sock=None):
+    async def handle_client(reader, writer):
+        pending = set()
+
+        async def respond(line):
+            writer.write((json.dumps(await engine.handle_line(line)) + "\n").encode('utf-8'))
+            await writer.drain()
+
+        while line := await reader.readline():
+            if line.strip():
+                task = asyncio.create_task(respond(line))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending)
+        writer.close()
+
+    if sock is None:
+        server = await asyncio.start_server(handle_client, host, port)
+    else:
+        server = await asyncio.start_server(handle_client, sock=sock)
+    async with server:
+        await server.serve_forever()
+
+async def main(args, sock=None):
+    engine = SessionEngine(workers=args.workers, session_ttl=args.session_ttl)
+    sweeper = asyncio.create_task(engine.sweep_idle_sessions())
+    try:
+        await engine.warm_up(args.tagger_free)
+        if args.port is None:
+            await serve_stdio(engine)
+        else:
+            await serve_tcp(engine, args.host, args.port, sock)
+    finally:
+        sweeper.cancel()
+        engine.close()
+
+# Each forked worker keeps its own stage timings, so each writes its own JSON file
+def run_worker(args, sock, index):
+    if args.metrics_json:
+        metrics.start_json_export(f"{args.metrics_json}.{index}", args.metrics_interval)
+    try:
+        asyncio.run(main(args, sock))
+    except KeyboardInterrupt:
+        pass
+
+# Load the models once, then fork `processes` workers that all accept connections on one socket.
+# Each worker holds only its own sessions; a session has to keep using the connection it started on.
+def serve_forked(args):
+    preload_for_workers(args.tagger_free)
+    sock = socket.create_server((args.host, args.port))
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=run_worker, args=(args, sock, index), daemon=True)
+               for index in range(args.processes)]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve chatbot sessions as JSON lines over stdio or TCP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="listen on this TCP port instead of stdio")
+    parser.add_argument("--workers", type=int, default=4, help="threads used for NLP and database work")
+    parser.add_argument("--session-ttl", type=float, default=SESSION_TTL,
+                        help="seconds a session may stay idle before it is closed")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="forked server processes sharing the models loaded once by the parent (TCP only)")
+    parser.add_argument("--seed", choices=SEED_MODES, default="incremental",
+                        help="how to seed the flight inventory at startup; use 'skip' for extra workers")
+    parser.add_argument("--tagger-free", action="store_true",
+                        help="lemmatise with the compiled POS lexicon instead of running the POS tagger each turn")
+    parser.add_argument("--metrics", action="store_true", help="time each stage of every turn")
+    parser.add_argument("--metrics-json", metavar="PATH",
+                        help="also write the stage timings to this JSON file (PATH.N for forked process N)")
+    parser.add_argument("--metrics-interval", type=float, default=10.0, help="seconds between JSON metric writes")
+    args = parser.parse_args()
+
+    if args.processes > 1 and args.port is None:
+        parser.error("--processes needs --port")
+    if args.metrics or args.metrics_json:
+        metrics.enable()
+    setup_database(args.seed)
+    if args.processes > 1:
+        serve_forked(args)
+    else:
+        if args.metrics_json:
+            metrics.start_json_export(args.metrics_json, args.metrics_interval)
+        asyncio.run(main(args))
@@ -0,0 +1,42 @@
+import gc, sys
+from concurrent.futures import ThreadPoolExecutor
+
+# Modules too slow to import before the first prompt; none of them may be imported by the greeting path
+HEAVY_MODULES = ("nltk", "sklearn", "scipy", "pandas", "joblib", "numpy")
+
+# Import the conversation and load everything its first turn needs: the compiled models
+# and the NLTK tokenizer, tagger and WordNet data. With `tagger_free`, turns are lemmatised
+# with the index's POS lexicon instead of the tagger.
+def load_conversation(tagger_free=False):
+    from Classes.conversation import conversation
+    from Classes.intent_matching import get_intent_index, enable_tagger_free_mode
+    from Classes.preprocessing import preprocess_turn
+    from Classes.sentiment_analysis import get_sentiment_scorer
+
+    get_intent_index()
+    if tagger_free:
+        enable_tagger_free_mode()
+    get_sentiment_scorer()
+    preprocess_turn.__wrapped__("warming up the models")
+    return conversation
+
+# Load the conversation on a background thread; the returned future re-raises any error from loading
+def start_warm_up(tagger_free=False):
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="warm-up")
+    future = executor.submit(load_conversation, tagger_free)
+    executor.shutdown(wait=False)
+    return future
+
+# Load everything before forking worker processes, so the workers share it instead of each loading a copy.
+# Model arrays are memory-mapped from Resources/models and shared through the page cache. The Python objects
+# (vocabularies, the tagger, WordNet) are inherited copy-on-write. Freezing them keeps
+# the garbage collector in each worker from touching, and so copying, the pages they live on.
+def preload_for_workers(tagger_free=False):
+    conversation = load_conversation(tagger_free)
+    gc.collect()
+    gc.freeze()
+    return conversation
+
+# The heavy modules imported so far
+def heavy_modules_loaded():
+    return sorted(name for name in HEAVY_MODULES if name in sys.modules)
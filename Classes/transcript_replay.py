@@ -0,0 +1,162 @@
+import argparse, itertools, json, multiprocessing, os, time
+from collections import Counter, deque
+from Classes.intent_matching import (find_answers_batch, match_intent_batch, get_intent_index, intent_index_key,
+                                     enable_tagger_free_mode)
+from Classes.sentiment_analysis import classify_sentiment_batch, get_sentiment_scorer, sentiment_model_key
+from Classes.startup import preload_for_workers
+
+# Prediction fields compared between runs
+LABELS = ("intent", "answer", "sentiment")
+
+# Read logged utterances one line at a time.
+# A line is a JSON object with "message" (or "text") and optional "id" and "session",
+# like a session server request, or just a JSON string. Lines without an id are numbered.
+def read_utterances(path):
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if isinstance(record, str):
+                    record = {"message": record}
+                text = record.get("message", record.get("text"))
+                if not isinstance(text, str):
+                    raise ValueError("no message")
+            except (ValueError, AttributeError):
+                yield {"id": number, "error": "Invalid utterance"}
+                continue
+            utterance = {"id": record.get("id", number), "message": text}
+            if "session" in record:
+                utterance["session"] = record["session"]
+            yield utterance
+
+# Load the models in a worker process, unless it inherited them from the parent
+def init_worker(tagger_free=False):
+    get_intent_index()
+    if tagger_free:
+        enable_tagger_free_mode()
+    get_sentiment_scorer()
+
+# Predict the intent, FAQ answer and sentiment for a chunk of utterances
+def score_chunk(utterances):
+    valid = [utterance for utterance in utterances if "error" not in utterance]
+    texts = [utterance["message"] for utterance in valid]
+    intents = match_intent_batch(texts)
+    sentiments = classify_sentiment_batch(texts)
+    answers_batch = find_answers_batch(texts, k=1)
+    for utterance, intent, sentiment, answers in zip(valid, intents, sentiments, answers_batch):
+        utterance.update(intent=intent, sentiment=sentiment,
+                         answer=answers[0][0] if answers else None,
+                         answer_score=round(answers[0][1], 4) if answers else None)
+        del utterance["message"]
+    return utterances
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+# Score every utterance in `source`, writing predictions in input order as they complete.
+# At most `workers * 2` chunks are in flight, so memory stays bounded however long the log is.
+def replay(source, output, workers, chunk_size, tagger_free=False):
+    count = 0
+    started = time.perf_counter()
+    with open(output, 'w', encoding='utf-8') as out:
+        def write(predictions):
+            nonlocal count
+            for prediction in predictions:
+                out.write(json.dumps(prediction) + "\n")
+            count += len(predictions)
+
+        chunks = chunked(read_utterances(source), chunk_size)
+        if workers <= 1:
+            init_worker(tagger_free)
+            for chunk in chunks:
+                write(score_chunk(chunk))
+        else:
+            # Forked workers inherit the models loaded here; otherwise each worker loads its own
+            if "fork" in multiprocessing.get_all_start_methods():
+                preload_for_workers(tagger_free)
+                context = multiprocessing.get_context("fork")
+            else:
+                context = multiprocessing.get_context()
+            with context.Pool(workers, initializer=init_worker, initargs=(tagger_free,)) as pool:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(pool.apply_async(score_chunk, (chunk,)))
+                    if len(pending) >= workers * 2:
+                        write(pending.popleft().get())
+                while pending:
+                    write(pending.popleft().get())
+    elapsed = time.perf_counter() - started
+    return {
+        "utterances": count,
+        "seconds": elapsed,
+        "utterances_per_second": count / elapsed if elapsed else float("inf"),
+        "intent_index": intent_index_key(),
+        "sentiment_model": sentiment_model_key(),
+        "tagger_free": tagger_free,
+    }
+
+def read_predictions(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+# Label counts of two prediction files, and how many predictions changed between them.
+# Both files are streamed side by side; changes are only counted while their ids line up.
+def compare_runs(previous_path, current_path):
+    distributions = {label: (Counter(), Counter()) for label in LABELS}
+    changed = Counter()
+    aligned = 0
+    for before, after in itertools.zip_longest(read_predictions(previous_path), read_predictions(current_path)):
+        for label in LABELS:
+            if before is not None:
+                distributions[label][0][before.get(label)] += 1
+            if after is not None:
+                distributions[label][1][after.get(label)] += 1
+        if before is not None and after is not None and before["id"] == after["id"]:
+            aligned += 1
+            changed.update(label for label in LABELS if before.get(label) != after.get(label))
+    return {
+        "aligned": aligned,
+        "changed": {label: changed[label] for label in LABELS},
+        "distributions": {label: {str(value): {"before": counts[0][value], "after": counts[1][value]}
+                                  for value in counts[0].keys() | counts[1].keys()}
+                          for label, counts in distributions.items()},
+    }
+
+def print_comparison(comparison):
+    print(f"\n{comparison['aligned']} predictions matched by id; changed: "
+          + ", ".join(f"{label} {count}" for label, count in comparison["changed"].items()))
+    for label, counts in comparison["distributions"].items():
+        moved = sorted(((value, count) for value, count in counts.items() if count["before"] != count["after"]),
+                       key=lambda item: -abs(item[1]["after"] - item[1]["before"]))
+        print(f"\n{label}: {len(moved)} of {len(counts)} labels changed count")
+        for value, count in moved[:10]:
+            shown = value if len(value) <= 48 else value[:45] + "..."
+            print(f"  {shown:<50}{count['before']:>9}{count['after']:>9}{count['after'] - count['before']:>+9}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-score logged utterances with the current models.")
+    parser.add_argument("transcripts", help="JSONL file of utterances")
+    parser.add_argument("--output", required=True, help="JSONL file to write predictions to")
+    parser.add_argument("--compare", help="predictions from an earlier run to diff label counts against")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes; 1 runs in-process")
+    parser.add_argument("--chunk-size", type=int, default=256, help="utterances sent to a worker at a time")
+    parser.add_argument("--tagger-free", action="store_true",
+                        help="lemmatise with the compiled POS lexicon instead of running the POS tagger")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = replay(args.transcripts, args.output, args.workers, args.chunk_size, args.tagger_free)
+    if args.compare:
+        report["comparison"] = compare_runs(args.compare, args.output)
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print(f"Scored {report['utterances']} utterances in {report['seconds']:.1f}s "
+              f"({report['utterances_per_second']:,.0f}/sec) -> {args.output}")
+        if args.compare:
+            print_comparison(report["comparison"])
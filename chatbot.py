@@ -1,71 +1,54 @@
-from Classes.responses import get_response
-from Classes.intent_matching import match_intent, find_answer
-from Classes.booking_flow import booking_flow, display_and_cancel_booking
-from Classes.database_setup import setup_database
-from Classes.sentiment_analysis import classify_sentiment
+import time
+STARTED = time.perf_counter()
+
+import argparse, sys
+from Classes.database_setup import setup_database, SEED_MODES
+from Classes.dialogue import run_in_terminal
 from Classes.greeting import welcome_user
+from Classes.startup import start_warm_up, heavy_modules_loaded
 
 # Chatbot Main Loop
-def chatbot():
+def chatbot(seed="incremental", startup_report=False, tagger_free=False):
     """
     Main function for running the chatbot application.
     This function manages the chatbot's setup
     """
     # Initial database setup to ensure all prerequisites are in place.
-    setup_database()
-
-    # Initialise the user's name as None, to prompt a greeting upon first interaction.
-    name = None
-
-    # Begin infinite loop to handle continuous user interaction.
-    while True:
-        # If user's name is not yet set, prompt them with a welcome message.
-        if name is None:
-            name = welcome_user()
-
-        # Capture user input for processing.
-        user_input = input(f"{name}: ")
-
-        answer = find_answer(user_input)
-        if answer:
-            print(f"Bot: {answer}")
-            continue
-
-        # Determine the user's intent based on the input.
-        intent = match_intent(user_input)
-
-        # Respond based on the matched intent.
-        if intent == "greeting":
-            # Provide a greeting response, incorporating the user's name.
-            print(get_response("greeting", name=name))
-        elif intent == "booking":
-            # Handle the booking flow for the user.
-            booking_flow(name, user_input)
-        elif intent == "thanks":
-            # Respond to user expressions of gratitude.
-            print(get_response("thanks", name=name))
-        elif intent == "farewell":
-            # Respond to 'bye' related inputs and exit the chatbot loop.
-            print(get_response("farewell", name=name))
-            break
-        elif intent == "how_are_you":
-            # Respond to inquiries about the chatbot's state and analyse sentiment.
-            print(get_response("how_are_you"))
-            user_response = input(f"{name}: ")
-            classify_sentiment(user_response, name)
-        elif intent == "capabilities":
-            # Inform the user about the chatbot's capabilities.
-            print(get_response("capabilities"))
-        elif intent == "user_name":
-            # Remind the user of their recorded name.
-            print(get_response("user_name", name=name))
-        elif intent == "edit_view_booking":
-            # Allow the user to edit or cancel an existing booking.
-            display_and_cancel_booking(name)
-        else:
-            # Handle unrecognised inputs by prompting clarification.
-            print("Bot: I'm not sure I understand. Could you please clarify?")
+    setup_database(seed)
+
+    # Load the NLP modules and models in the background while the user types their name.
+    timings = {"database_ready": time.perf_counter() - STARTED}
+    warm_up = start_warm_up(tagger_free)
+    warm_up.add_done_callback(lambda _: timings.setdefault("models_ready", time.perf_counter() - STARTED))
+    timings["first_prompt"] = time.perf_counter() - STARTED
+    heavy_at_prompt = heavy_modules_loaded()
+    name = run_in_terminal(welcome_user())
+
+    # Wait for the warm-up only if the user answered before it finished.
+    waiting = time.perf_counter()
+    conversation = warm_up.result()
+    timings["waited_for_models"] = time.perf_counter() - waiting
+    timings.setdefault("models_ready", time.perf_counter() - STARTED)
+    if startup_report:
+        print_startup_report(timings, heavy_at_prompt)
+
+    # Run the conversation in the terminal until the user says goodbye.
+    run_in_terminal(conversation(name))
+
+# Report how long each startup step took, on stderr so the conversation output is unchanged
+def print_startup_report(timings, heavy_at_prompt):
+    print(f"Startup: database ready {timings['database_ready']:.3f}s, first prompt {timings['first_prompt']:.3f}s, "
+          f"models ready {timings['models_ready']:.3f}s, waited {timings['waited_for_models']:.3f}s for models; "
+          f"heavy modules before the prompt: {', '.join(heavy_at_prompt) or 'none'}", file=sys.stderr)
 
 # Run the chatbot if the script is executed directly.
 if __name__ == "__main__":
-    chatbot()
+    parser = argparse.ArgumentParser(description="Flight booking chatbot")
+    parser.add_argument("--seed", choices=SEED_MODES, default="incremental",
+                        help="how to seed the flight inventory at startup (default: incremental)")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="print how long startup took, after the name prompt, to stderr")
+    parser.add_argument("--tagger-free", action="store_true",
+                        help="lemmatise with the compiled POS lexicon instead of running the POS tagger each turn")
+    args = parser.parse_args()
+    chatbot(args.seed, args.startup_report, args.tagger_free)